@@ -2,6 +2,7 @@
 import os
 import sys
 import argparse
+import copy
 import textwrap
 import logging
 import re
@@ -9,13 +10,16 @@ import io
 import csv
 import sqlite3
 import discord
+from typing import Literal
 from discord import ForumChannel, ForumTag, Thread, app_commands
 from discord.ext import commands
 
 from game_defs import *
 from game_data import *
-from card_rendering import EquipmentCardRenderer, Icons
-from run_changelog import generate_changelog_text
+from card_rendering import EquipmentCardRenderer, shared_icons
+from render_output import ENCODING_PROFILES, BytesSink
+from changelog_diff import generate_changelog_text
+from filter_query import FilterSyntaxError
 from lib import *
 
 logging.basicConfig(
@@ -28,6 +32,7 @@ logger.info("Starting discord-bot.")
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--sync", "-s", action="store_true")
+parser.add_argument("--no-cache", action="store_true")
 args = parser.parse_args()
 
 intents = discord.Intents.default()
@@ -36,7 +41,11 @@ intents.message_content = True
 bot = commands.Bot(command_prefix="$", intents=intents)
 
 
-db = GameDatabase()
+# Shared with run_changelog, which loads the previous data only for $changelog
+current_db.use_cache = not args.no_cache
+previous_db.use_cache = not args.no_cache
+db = current_db.get()
+logger.info(f"Loaded game data:\n{db.startup_report()}")
 
 QUERY_REGEX = re.compile(r"\[\[([\w\- :]+)\]\]")
 RENDER_REGEX = re.compile(r"\{\{([\w\- :]+)\}\}")
@@ -143,9 +152,12 @@ async def scan_help(ctx: commands.Context):
     Ammo
     Short, Mid, Long, Melee
     Heat[operator][number]
-        Examples: Heat=3, Heat>1, Heat<4
+        Examples: Heat=3, Heat>1, Heat<=4, Heat!=0
     Range[operator][number]
-        Examples: Range=3, Range>1, Range<2
+        Examples: Range=3, Range>=1, Range<2
+    Target, Ammo, MaxCharge[operator][number]
+    Size[operator][size], Rating[operator][rating]
+        Examples: Size>=Medium, Rating=Ace
     Move```
     You can also filter for text in these categories:
     ```
@@ -155,6 +167,10 @@ async def scan_help(ctx: commands.Context):
     Name
     Card Text
     Tags: AOE```
+    Search a single field with field:word or field:"some words", for example text:"fall back", name:cannon or tag:aoe.
+    Filters separated by commas must all match. Within one filter you can use AND, OR, NOT and parentheses:
+    ```
+    heat>=2 AND (type=energy OR type=ballistic), NOT ammo```
     For mechs:
     ```
     Name
@@ -165,6 +181,8 @@ async def scan_help(ctx: commands.Context):
         Examples: Heat=3, Heat>1, Heat<4
     HP[operator][number]
         Examples: HP=3, HP>1, HP<4
+    Armor[operator][number]
+    Faction=[faction]
     ```
     """
     help_str = textwrap.dedent(help_str)
@@ -181,7 +199,11 @@ async def scan_equipment(interaction: discord.Interaction, filter_str: str):
         )
         return
     filters = filter_str.split(",")
-    results = get_filtered_equipment(filters)
+    try:
+        results = db.get_filtered_equipment(filters)
+    except FilterSyntaxError as e:
+        await interaction.response.send_message(f"Bad filter: {e}")
+        return
     message = ""
     for equipment in results:
         message += f"{equipment}\n"
@@ -203,7 +225,11 @@ async def scan_mechs(interaction: discord.Interaction, filter_str: str):
         )
         return
     filters = filter_str.split(",")
-    results = get_filtered_mechs(filters)
+    try:
+        results = db.get_filtered_mechs(filters)
+    except FilterSyntaxError as e:
+        await interaction.response.send_message(f"Bad filter: {e}")
+        return
     message = ""
     for mech in results:
         message += f"{mech}\n"
@@ -216,8 +242,17 @@ async def scan_mechs(interaction: discord.Interaction, filter_str: str):
 
 
 @bot.tree.command()
-async def drones(interaction: discord.Interaction):
-    results = db.drones
+@app_commands.rename(filter_str="filter")
+@app_commands.describe(filter_str="Optional text to filter on.")
+async def drones(interaction: discord.Interaction, filter_str: Optional[str] = None):
+    if filter_str is None:
+        results = db.drones
+    else:
+        try:
+            results = db.get_filtered_drones(filter_str.split(","))
+        except FilterSyntaxError as e:
+            await interaction.response.send_message(f"Bad filter: {e}")
+            return
     message = ""
     for drone in results:
         message += f"{drone}\n"
@@ -230,8 +265,17 @@ async def drones(interaction: discord.Interaction):
 
 
 @bot.tree.command()
-async def maneuvers(interaction: discord.Interaction):
-    results = db.maneuvers
+@app_commands.rename(filter_str="filter")
+@app_commands.describe(filter_str="Optional text to filter on.")
+async def maneuvers(interaction: discord.Interaction, filter_str: Optional[str] = None):
+    if filter_str is None:
+        results = db.maneuvers
+    else:
+        try:
+            results = db.get_filtered_maneuvers(filter_str.split(","))
+        except FilterSyntaxError as e:
+            await interaction.response.send_message(f"Bad filter: {e}")
+            return
     message = ""
     for maneuver in results:
         message += f"{maneuver}\n"
@@ -250,8 +294,12 @@ async def changelog(ctx: commands.Context):
 
 
 @bot.tree.command()
-async def stats(interaction: discord.Interaction):
-    message = equipment_stats()
+@app_commands.describe(kind="Which cards to count.")
+async def stats(
+    interaction: discord.Interaction,
+    kind: Literal["equipment", "mechs", "drones", "maneuvers"] = "equipment",
+):
+    message = db.stats_report(kind)
     await reply(interaction, message, "stats.txt")
 
 
@@ -338,16 +386,25 @@ async def render(ctx: commands.Context, query: str, flavor_text: str):
                 f"Running live render for {actual.name} (fuzzy {matches.threshold})."
             )
         await reply(ctx, message)
-        processed_flavor_text = flavor_text.replace("\\n", "\n")
-        actual.flavor_text = processed_flavor_text
-        actual.filename = f"outputs/live_render.png"
-        with Icons() as icons, EquipmentCardRenderer(actual, icons) as card:
+        # Render a copy, so the flavor text never leaks into the shared database
+        preview = copy.copy(actual)
+        preview.flavor_text = flavor_text.replace("\\n", "\n")
+        sink = BytesSink(profile=ENCODING_PROFILES["flat"])
+        with EquipmentCardRenderer(preview, shared_icons(), sink) as card:
             card.render()
-        await ctx.reply(f"Rendered result:", file=discord.File(actual.filename))
+        await ctx.reply(
+            f"Rendered result:", file=discord.File(sink.buffer, "live_render.png")
+        )
     else:
         await reply(ctx, f"Live render not yet supported for non-Equipment.")
 
 
+@bot.command()
+async def cache_stats(ctx: commands.Context):
+    message = f"Fuzzy query cache (data version {db.version}):\n{db.query_cache}"
+    await reply(ctx, message)
+
+
 @bot.command()
 async def tutorial(ctx: commands.Context):
     message = """
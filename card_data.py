@@ -1,5 +1,8 @@
+from functools import lru_cache
 from wand.image import Image
 
+from icon_atlas import load_atlas
+
 # At 300 DPI
 CARD_WIDTH = 750
 CARD_HEIGHT = 1050
@@ -14,33 +17,44 @@ SMALL_FONT_SIZE = int(CARD_HEIGHT / 28)
 TRACKER_SIZE = int(CARD_HEIGHT / 10)
 
 
+# Icon attribute -> (texture, width, height)
+ICON_TEXTURES = {
+    "heat": ("textures/heat.png", ICON_SIZE, ICON_SIZE),
+    "melee": ("textures/melee.png", ICON_SIZE, ICON_SIZE),
+    "range": ("textures/range.png", ICON_SIZE, ICON_SIZE),
+    "ammo": ("textures/ammo.png", ICON_SIZE, ICON_SIZE),
+    "maxcharge": ("textures/maxcharge.png", ICON_SIZE, ICON_SIZE),
+    "armor": ("textures/armor.png", LARGE_FONT_SIZE, LARGE_FONT_SIZE),
+    "card_rotation": ("textures/card-rotation.png", LARGE_ICON_SIZE, LARGE_ICON_SIZE),
+}
+
+
+def resize_icon(name: str, spec: tuple) -> bytes:
+    path, width, height = spec
+    with Image(filename=path) as icon:
+        icon.resize(width, height)
+        return icon.make_blob("png")
+
+
 class Icons:
+    """
+    The Wand icons at their drawn sizes, read from the icon atlas cache and shared
+    through shared_icons()
+    """
+
     def __init__(self):
-        pass
+        for name, icon in load_atlas(
+            "wand_icons", ICON_TEXTURES, resize_icon, lambda blob: Image(blob=blob)
+        ).items():
+            setattr(self, name, icon)
 
     def __enter__(self):
-        self.heat = Image(filename="textures/heat.png")
-        self.melee = Image(filename="textures/melee.png")
-        self.range = Image(filename="textures/range.png")
-        self.ammo = Image(filename="textures/ammo.png")
-        self.maxcharge = Image(filename="textures/maxcharge.png")
-        self.armor = Image(filename="textures/armor.png")
-        self.card_rotation = Image(filename="textures/card-rotation.png")
-
-        self.heat.resize(ICON_SIZE, ICON_SIZE)
-        self.melee.resize(ICON_SIZE, ICON_SIZE)
-        self.range.resize(ICON_SIZE, ICON_SIZE)
-        self.ammo.resize(ICON_SIZE, ICON_SIZE)
-        self.maxcharge.resize(ICON_SIZE, ICON_SIZE)
-        self.armor.resize(LARGE_FONT_SIZE, LARGE_FONT_SIZE)
-        self.card_rotation.resize(LARGE_ICON_SIZE, LARGE_ICON_SIZE)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.heat.close()
-        self.melee.close()
-        self.range.close()
-        self.ammo.close()
-        self.maxcharge.close()
-        self.armor.close()
-        self.card_rotation.close()
+        pass
+
+
+@lru_cache(maxsize=None)
+def shared_icons() -> Icons:
+    return Icons()
@@ -1,21 +1,43 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import glob
+import hashlib
 import argparse
+import logging
+import multiprocessing
+import traceback
+from dataclasses import asdict
 from enum import Enum
+from functools import lru_cache, partial
 from abc import ABC, abstractmethod
 from io import BytesIO
 from textwrap import dedent
 
+import emoji
+
 from pilmoji import Pilmoji
-from pilmoji.source import Twemoji
+from pilmoji.source import BaseSource
 from PIL import Image, ImageFont, ImageDraw, ImageText
 
 from typing import Optional, Union
 
-from game_data import GameDatabase
+from changelog_diff import cached_full_changelog
+from game_data import current_db
 from game_defs import Drone, Equipment, Maneuver, Mech
-from lib import wrap_text_tagged
+from icon_atlas import load_atlas
+from render_manifest import RenderManifest
+from render_output import (
+    ENCODING_PROFILES,
+    EncodingProfile,
+    FileSink,
+    ImageSink,
+    OutputSink,
+)
+from text_layout import TextLayout, layout_text
+
+logger = logging.getLogger(__name__)
 
 CARD_WIDTH = 1500
 CARD_HEIGHT = 2100
@@ -31,6 +53,10 @@ TRACKER_FONT_SIZE = int(CARD_HEIGHT / 20)
 SMALL_FONT_SIZE = int(CARD_HEIGHT / 28)
 FLAVOR_FONT_SIZE = int(CARD_HEIGHT / 32)
 
+BOLD_FONT = "./fonts/HackNerdFont-Bold.ttf"
+REGULAR_FONT = "./fonts/HackNerdFont-Regular.ttf"
+ITALIC_FONT = "./fonts/Hack-Italic.ttf"
+
 FLAG_HEIGHT = int(HUGE_FONT_SIZE + FLAVOR_FONT_SIZE)
 
 ICON_SIZE = int(CARD_WIDTH / 10)
@@ -44,52 +70,230 @@ MECH_MARGIN = int(TRACKER_SIZE * 1.2)
 
 SPACING = 13
 
+# Bump whenever drawing or layout code changes so incremental renders redo every card
+RENDERER_VERSION = 2
+
+# Files every card may read: icons, custom emoji, flags, emoji and fonts
+SHARED_RENDER_INPUTS = [
+    "textures/*.png",
+    "textures/flags/*.png",
+    "textures/emoji/*.png",
+    "fonts/*",
+]
+
+
+def card_art_path(card: Union[Equipment, Mech, Maneuver, Drone]) -> str:
+    if isinstance(card, Mech):
+        return f"textures/flags/{card.faction.lower()}.png"
+    image_path = f"textures/card-art/{card.normalized_name}.png"
+    if not os.path.exists(image_path):
+        image_path = f"textures/card-art/placeholder.png"
+    return image_path
+
+
+class FontBuffer:
+    """
+    A font file held in memory. FreeType is given the same bytes object on every
+    read, so all sizes of a face share one copy of the file.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.data = f.read()
+
+    def read(self) -> bytes:
+        return self.data
+
+
+@lru_cache(maxsize=None)
+def font_buffer(path: str) -> FontBuffer:
+    return FontBuffer(path)
+
+
+ART_CACHE_DIRECTORY = "textures/.cache/card-art"
+
+
+def fit_image(image: Image.Image, width: int, height: int) -> Image.Image:
+    """
+    Scales image to cover width x height and crops the overflow evenly
+    """
+    # Resize to aspect ratio
+    ratio = max(width / image.width, height / image.height)
+    new_size = (int(image.width * ratio), int(image.height * ratio))
+    the_image = image.resize(new_size, Image.Resampling.LANCZOS)
+    # Crop box
+    left = (the_image.width - width) / 2
+    top = (the_image.height - height) / 2
+    right = (the_image.width + width) / 2
+    bottom = (the_image.height + height) / 2
+    return the_image.crop((left, top, right, bottom))
+
+
+def fitted_art(path: str, width: int, height: int) -> Image.Image:
+    """
+    Returns the art at path already fitted to width x height. Callers only paste
+    the result, so it is shared and must not be modified.
+    """
+    return cached_fitted_art(path, os.stat(path).st_mtime_ns, width, height)
+
+
+# A fitted image is several megabytes and most art belongs to a single card, whose
+# repeat renders the disk cache already serves. A few entries keep art that many
+# cards share, like the placeholder, without each worker holding every card's art.
+@lru_cache(maxsize=4)
+def cached_fitted_art(path: str, mtime: int, width: int, height: int) -> Image.Image:
+    # The stem keeps the cache readable, the hash of the full path keeps art with
+    # the same file name in different directories apart
+    stem = os.path.splitext(os.path.basename(path))[0]
+    path_hash = hashlib.sha256(os.path.normpath(path).encode()).hexdigest()[:12]
+    prefix = f"{stem}-{path_hash}-{width}x{height}-"
+    cache_path = os.path.join(ART_CACHE_DIRECTORY, f"{prefix}{mtime}.png")
+    if os.path.exists(cache_path):
+        try:
+            with Image.open(cache_path) as cached:
+                cached.load()
+                return cached.copy()
+        except OSError:
+            pass
+    with Image.open(path) as img:
+        fitted = fit_image(img, width, height)
+    try:
+        os.makedirs(ART_CACHE_DIRECTORY, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        fitted.save(tmp_path, format="PNG", compress_level=1)
+        os.replace(tmp_path, cache_path)
+        # Versions of this art fitted at this size from an older mtime are dead
+        # weight. Other sizes stay, as the same art may be drawn at several.
+        pattern = os.path.join(ART_CACHE_DIRECTORY, f"{glob.escape(prefix)}*.png")
+        for stale in glob.glob(pattern):
+            stale_mtime = os.path.basename(stale)[len(prefix) : -len(".png")]
+            if stale_mtime.isdigit() and int(stale_mtime) < mtime:
+                os.remove(stale)
+    except OSError:
+        pass
+    return fitted
+
+
+@lru_cache(maxsize=None)
+def load_font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    """
+    Returns the process-wide face for (path, size), loading it on first use
+    """
+    return ImageFont.truetype(font_buffer(path), size)
+
+
+EMOJI_DIRECTORY = "textures/emoji"
+
+# Emoji image bytes by path, or None when there is no local file, shared by every
+# render in the process
+emoji_files: dict[str, Optional[bytes]] = {}
+
+
+def emoji_path(emoji: str) -> str:
+    """
+    Local image for a unicode emoji, named by codepoints the way Twemoji names its
+    assets, e.g. textures/emoji/1f680.png
+    """
+    codepoints = "-".join(f"{ord(c):x}" for c in emoji if c != "\ufe0f")
+    return os.path.join(EMOJI_DIRECTORY, f"{codepoints}.png")
+
+
+def read_emoji(path: str, name: str) -> Optional[BytesIO]:
+    if path not in emoji_files:
+        try:
+            with open(path, "rb") as f:
+                emoji_files[path] = f.read()
+        except OSError:
+            emoji_files[path] = None
+            logger.warning(f"No local image for emoji {name} ({path})")
+    data = emoji_files[path]
+    return None if data is None else BytesIO(data)
+
+
+class SteelVanguardSource(BaseSource):
+    """
+    Serves emoji from local files only, so a render never waits on the network.
+    Custom <:tag:> emoji come from textures/ and unicode emoji from
+    textures/emoji/. A missing image is logged once and the emoji is left to
+    pilmoji's plain text fallback.
+    """
+
+    def get_emoji(self, emoji: str, /) -> Optional[BytesIO]:
+        return read_emoji(emoji_path(emoji), emoji)
+
+    def get_discord_emoji(self, id: int, /) -> Optional[BytesIO]:
+        logger.warning(f"Discord emoji {id} is not available offline")
+        return None
 
-class SteelVanguardSource(Twemoji):
     def get_custom_emoji(self, tag: str, /) -> Optional[BytesIO]:
-        with open(f"./textures/{tag}.png", "rb") as f:
-            buf = BytesIO(f.read())
-        return buf
+        return read_emoji(f"./textures/{tag}.png", f"<:{tag}:>")
+
+
+def missing_emoji(cards: list) -> dict[str, list[str]]:
+    """
+    Returns the unicode emoji in the cards' text without a local image, with the
+    names of the cards that use them
+    """
+    missing = {}
+    for card in cards:
+        text = f"{card}\n{getattr(card, 'flavor_text', None) or ''}"
+        for match in emoji.emoji_list(text):
+            if not os.path.exists(emoji_path(match["emoji"])):
+                missing.setdefault(match["emoji"], []).append(card.name)
+    return missing
+
+
+# Icon attribute -> (texture, width, height)
+ICON_TEXTURES = {
+    "heat": ("textures/heat.png", ICON_SIZE, ICON_SIZE),
+    "engage": ("textures/engage.png", ICON_SIZE, ICON_SIZE),
+    "range": ("textures/range.png", ICON_SIZE, ICON_SIZE),
+    "target": ("textures/target.png", ICON_SIZE, ICON_SIZE),
+    "ammo": ("textures/ammo.png", ICON_SIZE, ICON_SIZE),
+    "maxcharge": ("textures/maxcharge.png", ICON_SIZE, ICON_SIZE),
+    "charge": ("textures/charge.png", ICON_SIZE, ICON_SIZE),
+    "info": ("textures/info.png", SECTION_ICON_SIZE, SECTION_ICON_SIZE),
+    "action": ("textures/action.png", SECTION_ICON_SIZE, SECTION_ICON_SIZE),
+    "trigger": ("textures/trigger.png", SECTION_ICON_SIZE, SECTION_ICON_SIZE),
+    "passive": ("textures/passive.png", SECTION_ICON_SIZE, SECTION_ICON_SIZE),
+    "star": ("textures/star.png", int(ICON_SIZE / 2), int(ICON_SIZE / 2)),
+}
+
+
+def resize_icon(name: str, spec: tuple) -> tuple[str, tuple[int, int], bytes]:
+    path, width, height = spec
+    with Image.open(path) as img:
+        icon = img.resize((width, height))
+    return icon.mode, icon.size, icon.tobytes()
+
+
+def decode_icon(encoded: tuple[str, tuple[int, int], bytes]) -> Image.Image:
+    return Image.frombytes(*encoded)
 
 
 class Icons:
+    """
+    The card icons at their drawn sizes, read from the icon atlas cache. Renderers
+    only read from them, so one instance can be shared by every render; use
+    shared_icons() rather than building a new one per card.
+    """
+
+    def __init__(self):
+        for name, icon in load_atlas(
+            "icons", ICON_TEXTURES, resize_icon, decode_icon
+        ).items():
+            setattr(self, name, icon)
+
     def __enter__(self):
-        heat = Image.open("textures/heat.png")
-        engage = Image.open("textures/engage.png")
-        rng = Image.open("textures/range.png")
-        target = Image.open("textures/target.png")
-        ammo = Image.open("textures/ammo.png")
-        maxcharge = Image.open("textures/maxcharge.png")
-        charge = Image.open("textures/charge.png")
-        info = Image.open("textures/info.png")
-        action = Image.open("textures/action.png")
-        trigger = Image.open("textures/trigger.png")
-        passive = Image.open("textures/passive.png")
-        star = Image.open("textures/star.png")
-
-        self.heat = heat.resize((ICON_SIZE, ICON_SIZE))
-        self.engage = engage.resize((ICON_SIZE, ICON_SIZE))
-        self.range = rng.resize((ICON_SIZE, ICON_SIZE))
-        self.target = target.resize((ICON_SIZE, ICON_SIZE))
-        self.ammo = ammo.resize((ICON_SIZE, ICON_SIZE))
-        self.maxcharge = maxcharge.resize((ICON_SIZE, ICON_SIZE))
-        self.charge = charge.resize((ICON_SIZE, ICON_SIZE))
-        self.info = info.resize((SECTION_ICON_SIZE, SECTION_ICON_SIZE))
-        self.action = action.resize((SECTION_ICON_SIZE, SECTION_ICON_SIZE))
-        self.trigger = trigger.resize((SECTION_ICON_SIZE, SECTION_ICON_SIZE))
-        self.passive = passive.resize((SECTION_ICON_SIZE, SECTION_ICON_SIZE))
-        self.star = star.resize((int(ICON_SIZE / 2), int(ICON_SIZE / 2)))
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.heat.close()
-        self.engage.close()
-        self.range.close()
-        self.ammo.close()
-        self.maxcharge.close()
-        self.info.close()
-        self.action.close()
-        self.trigger.close()
+        pass
+
+
+@lru_cache(maxsize=None)
+def shared_icons() -> Icons:
+    return Icons()
 
 
 class CardTextSectionType(Enum):
@@ -125,33 +329,61 @@ def card_text_sections(card: Union[Equipment, Mech, Maneuver, Drone]):
     return sections
 
 
+# Blank canvases with each renderer's static layers drawn, by Renderer.template() key
+templates: dict[tuple, Image.Image] = {}
+
+
 class Renderer(ABC):
-    def __init__(self, icons: Icons, filename: str, width: int, height: int):
+    # Name of the ENCODING_PROFILES entry files are written with, unless a sink is
+    # given. Cards are opaque, so dropping the alpha channel loses nothing.
+    ENCODING = "flat"
+
+    def __init__(
+        self,
+        icons: Icons,
+        filename: str,
+        width: int,
+        height: int,
+        sink: Optional[OutputSink] = None,
+    ):
         self.icons = icons
         self.filename = filename
-        self.huge_font = ImageFont.truetype(
-            "./fonts/HackNerdFont-Bold.ttf", HUGE_FONT_SIZE
-        )
-        self.large_font = ImageFont.truetype(
-            "./fonts/HackNerdFont-Bold.ttf", LARGE_FONT_SIZE
-        )
-        self.name_font = ImageFont.truetype(
-            "./fonts/HackNerdFont-Bold.ttf", NAME_FONT_SIZE
-        )
-        self.small_font = ImageFont.truetype(
-            "./fonts/HackNerdFont-Regular.ttf", SMALL_FONT_SIZE
-        )
-        self.icon_font = ImageFont.truetype(
-            "./fonts/HackNerdFont-Regular.ttf", int(ICON_SIZE * 0.8)
-        )
-        self.flavor_text_font = ImageFont.truetype(
-            "./fonts/Hack-Italic.ttf", FLAVOR_FONT_SIZE
-        )
+        # Without a sink the image is written to filename, encoded as self.encoding
+        self.sink = sink
+        self.encoding = self.ENCODING
+        self.huge_font = load_font(BOLD_FONT, HUGE_FONT_SIZE)
+        self.large_font = load_font(BOLD_FONT, LARGE_FONT_SIZE)
+        self.name_font = load_font(BOLD_FONT, NAME_FONT_SIZE)
+        self.small_font = load_font(REGULAR_FONT, SMALL_FONT_SIZE)
+        self.icon_font = load_font(REGULAR_FONT, int(ICON_SIZE * 0.8))
+        self.flavor_text_font = load_font(ITALIC_FONT, FLAVOR_FONT_SIZE)
         self.width = width
         self.height = height
 
+    def template_key(self) -> tuple:
+        """
+        The layout values the template depends on, beyond the renderer and canvas size
+        """
+        return ()
+
+    def draw_template(self):
+        """
+        Draws the layers shared by every card of this renderer, before any of the
+        card's own layers
+        """
+        pass
+
+    def template(self) -> Image.Image:
+        key = (type(self).__name__, self.width, self.height) + self.template_key()
+        if key not in templates:
+            self.image = Image.new("RGBA", (self.width, self.height), (255, 255, 255))
+            self.draw = ImageDraw.Draw(self.image)
+            self.draw_template()
+            templates[key] = self.image
+        return templates[key]
+
     def __enter__(self):
-        self.image = Image.new("RGBA", (self.width, self.height), (255, 255, 255))
+        self.image = self.template().copy()
         self.pilmoji = Pilmoji(
             self.image,
             source=SteelVanguardSource,
@@ -162,9 +394,14 @@ class Renderer(ABC):
         return self
 
     def __exit__(self, exception_type, exception_value, exception_traceback):
-        self.image.save(self.filename)
-        self.image.close()
         self.pilmoji.close()
+        sink = self.sink or FileSink(
+            self.filename, profile=ENCODING_PROFILES[self.encoding]
+        )
+        if exception_type is None:
+            sink.write(self.image)
+        if exception_type is not None or not sink.keeps_image:
+            self.image.close()
 
     @abstractmethod
     def render(self):
@@ -187,20 +424,10 @@ class Renderer(ABC):
         self.draw_rectangle(0, 0, self.width, self.height)
 
     def draw_bordered_image(
-        self, image: Optional[Image.Image], x: int, y: int, width: int, height: int
+        self, image_path: Optional[str], x: int, y: int, width: int, height: int
     ):
-        if image is not None:
-            # Resize to aspect ratio
-            ratio = max(width / image.width, height / image.height)
-            new_size = (int(image.width * ratio), int(image.height * ratio))
-            the_image = image.resize(new_size, Image.Resampling.LANCZOS)
-            # Crop box
-            left = (the_image.width - width) / 2
-            top = (the_image.height - height) / 2
-            right = (the_image.width + width) / 2
-            bottom = (the_image.height + height) / 2
-            the_image = the_image.crop((left, top, right, bottom))
-            self.image.paste(the_image, (x, y))
+        if image_path is not None:
+            self.image.paste(fitted_art(image_path, width, height), (x, y))
         self.draw_rectangle(x, y, width, height)
 
     def draw_card_text(
@@ -208,9 +435,8 @@ class Renderer(ABC):
         card_text_sections: list[CardTextSection],
         x: int,
         y: int,
-        max_chars: Optional[int] = None,
+        max_width: Optional[int] = None,
     ):
-        section_num = 0
         sections = sorted(card_text_sections, key=lambda x: x.section_type.value)
         for section in sections:
             if section.section_type == CardTextSectionType.INFO:
@@ -221,14 +447,8 @@ class Renderer(ABC):
                 icon = self.icons.trigger
             else:
                 icon = self.icons.passive
-            num_lines = self.draw_card_text_section(
-                x,
-                y + int(section_num * (SMALL_FONT_SIZE + 2)),
-                icon,
-                section.text,
-                max_chars,
-            )
-            section_num += num_lines + 0.5
+            layout = self.draw_card_text_section(x, y, icon, section.text, max_width)
+            y += layout.height + layout.line_height // 2
 
     def draw_card_text_section(
         self,
@@ -236,22 +456,23 @@ class Renderer(ABC):
         y: int,
         icon: Image.Image,
         text: str,
-        max_chars: Optional[int] = None,
-    ) -> int:
+        max_width: Optional[int] = None,
+    ) -> TextLayout:
         self.image.alpha_composite(icon, (x, y - 1))
-        if max_chars is None:
-            width_in_characters = int(CARD_WIDTH / (SMALL_FONT_SIZE * 0.6)) - 8
-        else:
-            width_in_characters = max_chars
-        wrapped_text = wrap_text_tagged(text, width_in_characters)
+        text_x = int(x + SMALL_FONT_SIZE * 1.5)
+        if max_width is None:
+            max_width = CARD_WIDTH - MARGIN - text_x
+        layout = layout_text(text, self.small_font, max_width, SPACING)
+        self.draw_layout((text_x, y), layout)
+        return layout
+
+    def draw_layout(self, xy: tuple[int, int], layout: TextLayout):
+        """
+        Draws small-font text laid out by layout_text, in one pass for all its lines
+        """
         self.pilmoji.text(
-            (int(x + SMALL_FONT_SIZE * 1.5), y),
-            wrapped_text,
-            "#000000",
-            font=self.small_font,
-            spacing=SPACING,
+            xy, layout.text, "#000000", font=self.small_font, spacing=SPACING
         )
-        return len(wrapped_text.splitlines())
 
 
 class CardRenderer(Renderer):
@@ -266,8 +487,14 @@ class CardRenderer(Renderer):
     IMAGE_HEIGHT = int(CARD_HEIGHT - IMAGE_Y - BORDER_MARGIN * 1.5 - CARD_TYPE_TEXT_Y)
     CARD_TEXT_Y = int(CARD_HEIGHT * 0.555)
 
-    def __init__(self, icons: Icons, filename: str):
-        super().__init__(icons, filename, CARD_WIDTH, CARD_HEIGHT)
+    def __init__(self, icons: Icons, filename: str, sink: Optional[OutputSink] = None):
+        super().__init__(icons, filename, CARD_WIDTH, CARD_HEIGHT, sink)
+
+    def template_key(self) -> tuple:
+        return (self.ICON_X, self.ICON_Y, self.IMAGE_X, self.IMAGE_HEIGHT)
+
+    def draw_template(self):
+        self.draw_border()
 
     def draw_border(self):
         super().draw_border()
@@ -392,9 +619,9 @@ class CardRenderer(Renderer):
             self.draw_top_icon_with_text(row, self.icons.maxcharge, str(maxcharge))
             row += 1
 
-    def draw_card_image(self, image: Optional[Image.Image]):
+    def draw_card_image(self, image_path: Optional[str]):
         self.draw_bordered_image(
-            image,
+            image_path,
             CardRenderer.IMAGE_X,
             CardRenderer.IMAGE_Y,
             CARD_WIDTH - CardRenderer.IMAGE_X - BORDER_MARGIN,
@@ -409,23 +636,26 @@ class CardRenderer(Renderer):
             font=self.small_font,
         )
 
+    def draw_reference_text(self, text: str):
+        """
+        Draws each line of text as its own paragraph, a little apart from the next
+        """
+        x = int(CARD_WIDTH / 20)
+        y = CARD_HEIGHT / 24
+        for line in text.split("\n"):
+            layout = layout_text(line, self.small_font, CARD_WIDTH - 2 * x, SPACING)
+            self.draw_layout((x, int(y)), layout)
+            y += layout.height - SPACING + SMALL_FONT_SIZE * 0.3
+
     def draw_flavor_text(self, text: Optional[str]):
         if text is None:
             return
-        width_in_characters = int(CARD_WIDTH / (FLAVOR_FONT_SIZE * 0.6)) - 5
-        wrapped_text = wrap_text_tagged(text, width_in_characters)
-        num_lines = wrapped_text.count("\n") + 1
+        layout = layout_text(
+            text, self.flavor_text_font, CARD_WIDTH - 2 * MARGIN, SPACING
+        )
         self.draw.text(
-            (
-                MARGIN,
-                int(
-                    CARD_HEIGHT
-                    - ICON_SIZE / 2
-                    - num_lines * (FLAVOR_FONT_SIZE + SPACING * 0.8)
-                    - SPACING
-                ),
-            ),
-            wrapped_text,
+            (MARGIN, int(CARD_HEIGHT - ICON_SIZE / 2 - layout.height - SPACING)),
+            layout.text,
             "#000000",
             font=self.flavor_text_font,
             align="left",
@@ -472,12 +702,13 @@ class CardRenderer(Renderer):
 class EquipmentCardRenderer(CardRenderer):
     NAME_X = int(ICON_SIZE * 2.2)
 
-    def __init__(self, equipment: Equipment, icons: Icons):
-        super().__init__(icons, equipment.filename)
+    def __init__(
+        self, equipment: Equipment, icons: Icons, sink: Optional[OutputSink] = None
+    ):
+        super().__init__(icons, equipment.filename, sink)
         self.equipment = equipment
 
     def render(self):
-        self.draw_border()
         self.draw_name(
             self.equipment.name,
             self.get_name_color(),
@@ -489,11 +720,7 @@ class EquipmentCardRenderer(CardRenderer):
             self.equipment.ammo,
             self.equipment.maxcharge,
         )
-        image_path = f"textures/card-art/{self.equipment.normalized_name}.png"
-        if not os.path.exists(image_path):
-            image_path = f"textures/card-art/placeholder.png"
-        with Image.open(image_path) as img:
-            self.draw_card_image(img)
+        self.draw_card_image(card_art_path(self.equipment))
         self.draw_card_type(
             f"{self.equipment.size} {self.equipment.type} {self.equipment.form}"
         )
@@ -522,22 +749,19 @@ class EquipmentCardRenderer(CardRenderer):
 class ManeuverCardRenderer(CardRenderer):
     TEXT_Y = int(CARD_HEIGHT / 2)
 
-    def __init__(self, maneuver: Maneuver, icons: Icons):
-        super().__init__(icons, maneuver.filename)
+    def __init__(
+        self, maneuver: Maneuver, icons: Icons, sink: Optional[OutputSink] = None
+    ):
+        super().__init__(icons, maneuver.filename, sink)
         self.maneuver = maneuver
 
     def render(self):
-        self.draw_border()
         self.draw_name(self.maneuver.name, "#00ff00")
         if self.maneuver.target is not None:
             self.draw_top_icon_with_text(
                 0, self.icons.target, str(self.maneuver.target)
             )
-        image_path = f"textures/card-art/{self.maneuver.normalized_name}.png"
-        if not os.path.exists(image_path):
-            image_path = f"textures/card-art/placeholder.png"
-        with Image.open(image_path) as img:
-            self.draw_card_image(img)
+        self.draw_card_image(card_art_path(self.maneuver))
         self.draw_card_type("Maneuver")
         self.draw_card_text(
             card_text_sections(self.maneuver), MARGIN, CardRenderer.CARD_TEXT_Y
@@ -547,12 +771,11 @@ class ManeuverCardRenderer(CardRenderer):
 class DroneCardRenderer(CardRenderer):
     TEXT_Y = int(CARD_HEIGHT / 2)
 
-    def __init__(self, drone: Drone, icons: Icons):
-        super().__init__(icons, drone.filename)
+    def __init__(self, drone: Drone, icons: Icons, sink: Optional[OutputSink] = None):
+        super().__init__(icons, drone.filename, sink)
         self.drone = drone
 
     def render(self):
-        self.draw_border()
         self.draw_name(self.drone.name, "#000000")
         row = 0
         if self.drone.range is not None:
@@ -563,11 +786,7 @@ class DroneCardRenderer(CardRenderer):
         if self.drone.target is not None:
             self.draw_top_icon_with_text(row, self.icons.target, str(self.drone.target))
             row += 1
-        image_path = f"textures/card-art/{self.drone.normalized_name}.png"
-        if not os.path.exists(image_path):
-            image_path = f"textures/card-art/placeholder.png"
-        with Image.open(image_path) as img:
-            self.draw_card_image(img)
+        self.draw_card_image(card_art_path(self.drone))
         self.draw_card_type("Drone")
         self.draw_card_text(
             card_text_sections(self.drone), MARGIN, CardRenderer.CARD_TEXT_Y
@@ -575,8 +794,14 @@ class DroneCardRenderer(CardRenderer):
 
 
 class KeywordReferenceCardRenderer(CardRenderer):
-    def __init__(self, icons: Icons):
-        super().__init__(icons, "keywords.png")
+    ENCODING = "palette"
+
+    def __init__(self, icons: Icons, sink: Optional[OutputSink] = None):
+        super().__init__(icons, "keywords.png", sink)
+
+    def draw_template(self):
+        # Reference cards have no border
+        pass
 
     def render(self):
         self.draw_name("Keywords", "#000000")
@@ -599,28 +824,18 @@ class KeywordReferenceCardRenderer(CardRenderer):
         Inert: Cannot be Disabled.
         Prepare: Next turn, you must perform the listed Action.
         """
-        text = dedent(text)
-        lines = text.split("\n")
-        width_in_characters = int(CARD_WIDTH / (SMALL_FONT_SIZE * 0.6)) - 4
-        y = CARD_HEIGHT / 24
-        for line in lines:
-            wrapped_text = wrap_text_tagged(line, width_in_characters)
-            newlines = len(wrapped_text.split("\n"))
-            self.pilmoji.text(
-                (int(CARD_WIDTH / 20), int(y)),
-                wrapped_text,
-                "#000000",
-                font=self.small_font,
-                spacing=SPACING,
-            )
-            y += (
-                (SMALL_FONT_SIZE + SPACING) * newlines - SPACING + SMALL_FONT_SIZE * 0.3
-            )
+        self.draw_reference_text(dedent(text))
 
 
 class RulesReferenceCardRenderer(CardRenderer):
-    def __init__(self, icons: Icons):
-        super().__init__(icons, "rules.png")
+    ENCODING = "palette"
+
+    def __init__(self, icons: Icons, sink: Optional[OutputSink] = None):
+        super().__init__(icons, "rules.png", sink)
+
+    def draw_template(self):
+        # Reference cards have no border
+        pass
 
     def render(self):
         self.draw_name("Turn Reference", "#000000")
@@ -642,28 +857,18 @@ class RulesReferenceCardRenderer(CardRenderer):
         3. 1 <:heat:>: Advance or Fall Back.
         4. Declare End of Round for yourself. Next Round, reset <:heat:> and status. Whoever declared first goes first.
         """
-        text = dedent(text)
-        lines = text.split("\n")
-        width_in_characters = int(CARD_WIDTH / (SMALL_FONT_SIZE * 0.6)) - 4
-        y = CARD_HEIGHT / 24
-        for line in lines:
-            wrapped_text = wrap_text_tagged(line, width_in_characters)
-            newlines = len(wrapped_text.split("\n"))
-            self.pilmoji.text(
-                (int(CARD_WIDTH / 20), int(y)),
-                wrapped_text,
-                "#000000",
-                font=self.small_font,
-                spacing=SPACING,
-            )
-            y += (
-                (SMALL_FONT_SIZE + SPACING) * newlines - SPACING + SMALL_FONT_SIZE * 0.3
-            )
+        self.draw_reference_text(dedent(text))
 
 
 class RegroupingReferenceCardRenderer(CardRenderer):
-    def __init__(self, icons: Icons):
-        super().__init__(icons, "regrouping.png")
+    ENCODING = "palette"
+
+    def __init__(self, icons: Icons, sink: Optional[OutputSink] = None):
+        super().__init__(icons, "regrouping.png", sink)
+
+    def draw_template(self):
+        # Reference cards have no border
+        pass
 
     def render(self):
         self.draw_name("Regrouping", "#000000")
@@ -677,23 +882,7 @@ class RegroupingReferenceCardRenderer(CardRenderer):
         1. Choose at least 1 mech to Advance.
         2. If you cannot legally Advance any mech, choose 1 mech to Advance anyway. It loses 1 HP for each <:heat:> it could not gain.
         """
-        text = dedent(text)
-        lines = text.split("\n")
-        width_in_characters = int(CARD_WIDTH / (SMALL_FONT_SIZE * 0.6)) - 4
-        y = CARD_HEIGHT / 24
-        for line in lines:
-            wrapped_text = wrap_text_tagged(line, width_in_characters)
-            newlines = len(wrapped_text.split("\n"))
-            self.pilmoji.text(
-                (int(CARD_WIDTH / 20), int(y)),
-                wrapped_text,
-                "#000000",
-                font=self.small_font,
-                spacing=SPACING,
-            )
-            y += (
-                (SMALL_FONT_SIZE + SPACING) * newlines - SPACING + SMALL_FONT_SIZE * 0.3
-            )
+        self.draw_reference_text(dedent(text))
 
 
 class MechRenderer(Renderer):
@@ -703,14 +892,29 @@ class MechRenderer(Renderer):
     ART_Y = int(MECH_PADDING + HUGE_FONT_SIZE + LARGE_FONT_SIZE)
     ART_W = int(MECH_WIDTH - ART_X - MECH_PADDING * 0.5)
     ART_H = int(MECH_HEIGHT - ART_Y - MECH_PADDING * 4.5)
+    HARDPOINT_Y = MECH_HEIGHT - 2 * MECH_PADDING
+    ARMOR_BOXES = 3
+    TEXT_WIDTH = int(ART_X - MECH_PADDING * 2.5 - SMALL_FONT_SIZE * 1.5)
 
-    def __init__(self, mech: Mech, icons: Icons):
-        super().__init__(icons, mech.filename, MECH_WIDTH, MECH_HEIGHT)
+    def __init__(self, mech: Mech, icons: Icons, sink: Optional[OutputSink] = None):
+        super().__init__(icons, mech.filename, MECH_WIDTH, MECH_HEIGHT, sink)
         self.mech = mech
 
-    def render(self):
+    def template_key(self) -> tuple:
+        # Mechs with fewer hardpoints have fewer boxes, so they get their own template
+        return (
+            MechRenderer.ART_X,
+            MechRenderer.ART_Y,
+            MechRenderer.ART_W,
+            MechRenderer.ART_H,
+            MechRenderer.STATS_Y,
+            MECH_PADDING,
+            TRACKER_SIZE,
+            len(self.mech.hardpoints),
+        )
+
+    def draw_template(self):
         self.draw_border()
-        self.draw_name()
         # image_path = f"textures/mech-art/{self.mech.normalized_name}.png"
         # if not os.path.exists(image_path):
         #    image_path = f"textures/mech-art/placeholder.png"
@@ -726,20 +930,32 @@ class MechRenderer(Renderer):
             MechRenderer.ART_X - int(MECH_PADDING),
             MechRenderer.ART_H,
         )
-        self.draw_flag()
-        self.draw_hardpoints()
-        self.draw_stats()
+        for x in self.hardpoint_xs():
+            self.draw_hardpoint_box(x, MechRenderer.HARDPOINT_Y)
+        self.draw_tracker(
+            MechRenderer.STATS_X,
+            MechRenderer.STATS_Y,
+            MechRenderer.ARMOR_BOXES,
+            None,
+            0,
+        )
         self.draw_engage_circle(
             int(MechRenderer.ART_X - MECH_PADDING - 3 * TRACKER_SIZE),
             int(MechRenderer.STATS_Y - 1.5 * TRACKER_SIZE),
             int(MechRenderer.ART_X - MECH_PADDING),
             int(MechRenderer.STATS_Y + 1.5 * TRACKER_SIZE),
         )
+
+    def render(self):
+        self.draw_name()
+        self.draw_flag()
+        self.draw_hardpoints()
+        self.draw_stats()
         self.draw_card_text(
             card_text_sections(self.mech),
             int(MECH_PADDING * 1.5),
             int(MECH_HEIGHT * 0.14),
-            max_chars=40,
+            max_width=MechRenderer.TEXT_WIDTH,
         )
 
     def get_name_color(self) -> str:
@@ -784,8 +1000,7 @@ class MechRenderer(Renderer):
         )
 
     def draw_flag(self):
-        image_path = f"textures/flags/{self.mech.faction.lower()}.png"
-        with Image.open(image_path) as img:
+        with Image.open(card_art_path(self.mech)) as img:
             ratio = FLAG_HEIGHT / img.height
             width = int(img.width * ratio)
             resized = img.resize((width, FLAG_HEIGHT))
@@ -793,13 +1008,17 @@ class MechRenderer(Renderer):
                 resized, (MECH_WIDTH - width - MECH_PADDING, MECH_PADDING)
             )
 
+    def hardpoint_xs(self) -> list[int]:
+        return [
+            int(MECH_PADDING / 2) + i * (CARD_WIDTH + int(MECH_PADDING / 2))
+            for i in range(len(self.mech.hardpoints))
+        ]
+
     def draw_hardpoints(self):
-        x = int(MECH_PADDING / 2)
-        for hardpoint in self.mech.hardpoints:
-            self.draw_hardpoint(x, MECH_HEIGHT - 2 * MECH_PADDING, hardpoint)
-            x += CARD_WIDTH + int(MECH_PADDING / 2)
+        for x, hardpoint in zip(self.hardpoint_xs(), self.mech.hardpoints):
+            self.draw_hardpoint_label(x, MechRenderer.HARDPOINT_Y, hardpoint)
 
-    def draw_hardpoint(self, x: int, y: int, text: str):
+    def draw_hardpoint_box(self, x: int, y: int):
         self.draw.line(
             [
                 (x, y),
@@ -811,6 +1030,8 @@ class MechRenderer(Renderer):
             fill="#000000",
             width=2,
         )
+
+    def draw_hardpoint_label(self, x: int, y: int, text: str):
         self.draw.text(
             (x + CARD_WIDTH / 2, int(y - LARGE_FONT_SIZE * 0.8)),
             text,
@@ -825,7 +1046,7 @@ class MechRenderer(Renderer):
 
     def draw_stats(self):
         stats = [
-            (f"Armor: {self.mech.armor}", "#888888", 3, None, 0),
+            (f"Armor: {self.mech.armor}", "#888888", MechRenderer.ARMOR_BOXES, None, 0),
             (f"HP", "#009f00", self.mech.hp, "#00ff00", 1),
             (f"Heat", "#9f0000", self.mech.hc, "#ff0000", 0),
         ]
@@ -842,7 +1063,9 @@ class MechRenderer(Renderer):
                 embedded_color=True,
                 font=self.large_font,
             )
-            self.draw_tracker(MechRenderer.STATS_X, y, stat[2], stat[3], stat[4])
+            # The armor tracker is a fixed empty box drawn in the template
+            if stat[3] is not None:
+                self.draw_tracker(MechRenderer.STATS_X, y, stat[2], stat[3], stat[4])
             y += int(TRACKER_SIZE * 1.75)
 
     def draw_engage_circle(self, x1: int, y1: int, x2: int, y2: int):
@@ -882,57 +1105,223 @@ class MechRenderer(Renderer):
                 )
 
 
-game_db = GameDatabase()
+RENDERERS = {
+    Equipment: EquipmentCardRenderer,
+    Mech: MechRenderer,
+    Maneuver: ManeuverCardRenderer,
+    Drone: DroneCardRenderer,
+}
+
+
+REFERENCE_RENDERERS = [
+    KeywordReferenceCardRenderer,
+    RulesReferenceCardRenderer,
+    RegroupingReferenceCardRenderer,
+]
+
+
+def card_encoding(
+    card: Union[Equipment, Mech, Maneuver, Drone], encoding: Optional[str] = None
+) -> EncodingProfile:
+    """
+    The profile card's PNG is written with, encoding overriding its renderer's own
+    """
+    return ENCODING_PROFILES[encoding or RENDERERS[type(card)].ENCODING]
+
+
+def init_worker():
+    # Forked workers inherit the parent's icons, spawned ones load the atlas here
+    shared_icons()
+
+
+def render_card(
+    icons: Icons,
+    card: Union[Equipment, Mech, Maneuver, Drone],
+    encoding: Optional[str] = None,
+) -> tuple[str, Optional[str]]:
+    """
+    Returns the output filename and, if rendering failed, the traceback. encoding
+    overrides the renderer's own encoding profile.
+    """
+    try:
+        with RENDERERS[type(card)](card, icons) as renderer:
+            renderer.encoding = encoding or renderer.encoding
+            renderer.render()
+    except Exception:
+        return card.filename, traceback.format_exc()
+    return card.filename, None
+
+
+def render_image(
+    icons: Icons, card: Union[Equipment, Mech, Maneuver, Drone]
+) -> Image.Image:
+    """
+    Renders card in memory, for stages that compose cards without writing them
+    """
+    sink = ImageSink()
+    with RENDERERS[type(card)](card, icons, sink) as renderer:
+        renderer.render()
+    return sink.image
+
+
+def render_in_worker(
+    card: Union[Equipment, Mech, Maneuver, Drone],
+    encoding: Optional[str] = None,
+) -> tuple[str, Optional[str]]:
+    return render_card(shared_icons(), card, encoding)
+
+
+def render_cards(
+    icons: Icons,
+    cards: list[Union[Equipment, Mech, Maneuver, Drone]],
+    jobs: int,
+    encoding: Optional[str] = None,
+) -> list[tuple[Union[Equipment, Mech, Maneuver, Drone], str]]:
+    """
+    Renders cards in this process or across a pool of jobs processes, and returns
+    (card, traceback) for every card that failed
+    """
+    by_filename = {card.filename: card for card in cards}
+    if jobs == 1:
+        results = (render_card(icons, card, encoding) for card in cards)
+        pool = None
+    else:
+        # Mech sheets take several times longer than cards, so start them first to
+        # keep the last workers from finishing long after the rest
+        cards = sorted(cards, key=lambda card: not isinstance(card, Mech))
+        pool = multiprocessing.Pool(jobs, initializer=init_worker)
+        results = pool.imap_unordered(
+            partial(render_in_worker, encoding=encoding), cards
+        )
+    failures = []
+    try:
+        for done, (filename, error) in enumerate(results, start=1):
+            card = by_filename[filename]
+            if error is None:
+                print(f"[{done}/{len(cards)}] {card.name}")
+            else:
+                print(f"[{done}/{len(cards)}] {card.name} FAILED")
+                failures.append((card, error))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return failures
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("action")
     parser.add_argument("--filter", "-f", action="append")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--timing", action="store_true")
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of render processes, 0 for one per core",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Render every card even if the manifest says it is up to date",
+    )
+    parser.add_argument(
+        "--encoding",
+        choices=ENCODING_PROFILES,
+        help="PNG encoding profile for every output, instead of each renderer's own",
+    )
     args = parser.parse_args()
-    with Icons() as icons:
-        if args.action == "equipment" or args.action == "all":
-            print("Rendering equipment...")
-            if args.filter is None:
-                eq_list = game_db.equipment
-            else:
-                eq_list = game_db.get_filtered_equipment(args.filter)
-            for equipment in eq_list:
-                with EquipmentCardRenderer(equipment, icons) as card:
-                    card.render()
-        if args.action == "mechs" or args.action == "all":
-            print("Rendering mechs...")
-            if args.filter is None:
-                eq_list = game_db.mechs
-            else:
-                eq_list = game_db.get_filtered_mechs(args.filter)
-            for mech in eq_list:
-                with MechRenderer(mech, icons) as card:
-                    card.render()
-        if args.action == "maneuvers" or args.action == "all":
-            print("Rendering maneuvers...")
-            if args.filter is None:
-                for maneuver in game_db.maneuvers:
-                    with ManeuverCardRenderer(maneuver, icons) as card:
-                        card.render()
-            else:
-                maneuver = game_db.get_maneuver(args.filter[0])
-                if maneuver is not None:
-                    with ManeuverCardRenderer(maneuver, icons) as card:
-                        card.render()
-        if args.action == "drones" or args.action == "all":
-            print("Rendering drones...")
-            for drone in game_db.drones:
-                with DroneCardRenderer(drone, icons) as card:
-                    card.render()
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    current_db.use_cache = not args.no_cache
+    game_db = current_db.get()
+    if args.timing:
+        print(game_db.startup_report())
+    if args.action == "emoji":
+        missing = missing_emoji(game_db.everything)
+        for name, users in missing.items():
+            print(f"{name} {emoji_path(name)}: {', '.join(users)}")
+        print(f"{len(missing)} emoji without a local image in {EMOJI_DIRECTORY}.")
+        return
+    cards = []
+    if args.action == "equipment" or args.action == "all":
+        print("Rendering equipment...")
+        if args.filter is None:
+            cards += game_db.equipment
+        else:
+            cards += game_db.get_filtered_equipment(args.filter)
+    if args.action == "mechs" or args.action == "all":
+        print("Rendering mechs...")
+        if args.filter is None:
+            cards += game_db.mechs
+        else:
+            cards += game_db.get_filtered_mechs(args.filter)
+    if args.action == "maneuvers" or args.action == "all":
+        print("Rendering maneuvers...")
+        if args.filter is None:
+            cards += game_db.maneuvers
+        else:
+            maneuver = game_db.get_maneuver(args.filter[0])
+            if maneuver is not None:
+                cards.append(maneuver)
+    if args.action == "drones" or args.action == "all":
+        print("Rendering drones...")
+        if args.filter is None:
+            cards += game_db.drones
+        else:
+            drone = game_db.get_drone(args.filter[0])
+            if drone is not None:
+                cards.append(drone)
+    if args.action == "changed":
+        # Only the cards the changelog reprints, so a balance patch renders the
+        # edited cards and not the whole catalogue
+        print("Rendering changed cards...")
+        cards += cached_full_changelog().reprinted_cards()
+    manifest = RenderManifest()
+    shared = manifest.shared_hash(RENDERER_VERSION, SHARED_RENDER_INPUTS)
+    fingerprints = {
+        card.filename: manifest.fingerprint(
+            card,
+            [card_art_path(card)],
+            shared,
+            asdict(card_encoding(card, args.encoding)),
+        )
+        for card in cards
+    }
+    stale = [
+        card
+        for card in cards
+        if args.force
+        or not manifest.is_current(card.filename, fingerprints[card.filename])
+    ]
+    print(f"{len(cards) - len(stale)} cards unchanged, rendering {len(stale)}")
+    with shared_icons() as icons:
+        failures = render_cards(icons, stale, jobs, args.encoding)
         if args.action == "references":
             print("Rendering references...")
-            with KeywordReferenceCardRenderer(icons) as card:
-                card.render()
-            with RulesReferenceCardRenderer(icons) as card:
-                card.render()
-            with RegroupingReferenceCardRenderer(icons) as card:
-                card.render()
+            for renderer in REFERENCE_RENDERERS:
+                with renderer(icons) as card:
+                    card.encoding = args.encoding or card.encoding
+                    card.render()
+    failed = {card.filename for card, _ in failures}
+    for card in stale:
+        if card.filename in failed:
+            manifest.forget(card.filename)
+        else:
+            manifest.record(card.filename, fingerprints[card.filename])
+    if args.filter is None and args.action != "changed":
+        # Every card of these kinds was in this run, so any other PNG is stale
+        keep = {card.filename for card in cards}
+        for directory in sorted({os.path.dirname(card.filename) for card in cards}):
+            for filename in manifest.prune(directory, keep):
+                print(f"Removed {filename}")
+    manifest.save()
+    if len(failures) > 0:
+        for card, error in failures:
+            print(f"\nFailed to render {card.name}:\n{error}", file=sys.stderr)
+        print(f"{len(failures)} of {len(stale)} cards failed.", file=sys.stderr)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
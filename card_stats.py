@@ -0,0 +1,270 @@
+import re
+from collections import Counter
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from column_store import ColumnStore
+from filter_query import SCHEMAS
+from game_defs import Drone, Equipment, Maneuver, Mech
+
+SIZES = ["Small", "Medium", "Large"]
+TYPES = [
+    "Ballistic",
+    "Energy",
+    "Melee",
+    "Missile",
+    "Nanite",
+    "Electronics",
+    "Drone",
+    "Auxiliary",
+]
+RANGES = [0, 1, 2, 3]
+RANGED_TYPES = ["Ballistic", "Energy"]
+
+# Card text markers counted once per card, in report order, with their display name
+TEXT_KEYWORDS = {
+    "Charge": "Charge",
+    "Disable": "Disable",
+    "AP": "AP",
+    "Shred": "Shred",
+    "<:vulnerable:>": "Vulnerable",
+    "<:overheat:>": "Overheat",
+    "<:shield:>": "Shield",
+    "<:suppression:>": "Suppression",
+}
+MOVE_WORDS = ["move", "reposition", "fall back", "advance"]
+
+# One scan of the text finds every marker. The lookahead lets matches overlap, so
+# "remove" does not hide the "move" inside it, and the move words ignore case.
+TEXT_MARKERS = re.compile(
+    "(?=({}|(?i:{})))".format(
+        "|".join(re.escape(k) for k in TEXT_KEYWORDS),
+        "|".join(re.escape(w) for w in ["remove"] + MOVE_WORDS),
+    )
+)
+
+
+def preset_counter(keys: Iterable) -> Counter:
+    """
+    A counter that lists keys in the given order, including the ones never seen
+    """
+    return Counter({key: 0 for key in keys})
+
+
+def text_markers(text: str) -> set[str]:
+    found = set()
+    for match in TEXT_MARKERS.finditer(text):
+        marker = match.group(1)
+        found.add(marker if marker in TEXT_KEYWORDS else marker.lower())
+    return found
+
+
+def card_columns(cards: list, columns: Optional[ColumnStore]) -> ColumnStore:
+    """
+    The cards' ColumnStore, built from their filter schema when none is given. A
+    given store must lay out exactly these cards, in this order.
+    """
+    if columns is not None:
+        return columns
+    if len(cards) == 0:
+        return ColumnStore(cards, {}, {})
+    return SCHEMAS[type(cards[0])].column_store(cards)
+
+
+class EquipmentStats:
+    """
+    Counts over non-Spare equipment. Stats, categories and tags are counted from
+    the column store, and only the text markers need a pass over the cards.
+    """
+
+    def __init__(
+        self, equipment: list[Equipment], columns: Optional[ColumnStore] = None
+    ):
+        columns = card_columns(equipment, columns)
+        spare = columns.any_of("tag", ["spare"])
+        counted = ~spare
+        self.total = columns.size
+        self.spare = int(np.count_nonzero(spare))
+        self.sizes = preset_counter(SIZES)
+        self.sizes.update(columns.value_counts("size", counted))
+        self.types = preset_counter(TYPES)
+        self.types.update(columns.value_counts("type", counted))
+        self.full_types = preset_counter((s, t) for s in SIZES for t in TYPES)
+        self.full_types.update(
+            ColumnStore.counts(
+                {
+                    (size, type): columns.any_of("size", [size_key])
+                    & columns.any_of("type", [type_key])
+                    & counted
+                    for size_key, size in columns.labels["size"].items()
+                    for type_key, type in columns.labels["type"].items()
+                }
+            )
+        )
+        self.ranges = preset_counter(RANGES)
+        self.ranges.update(columns.histogram("range", counted))
+        self.range_types = preset_counter((t, r) for r in RANGES for t in RANGED_TYPES)
+        for t, r in self.range_types:
+            in_range = columns.any_of("type", [t.lower()]) & columns.compare(
+                "range", "=", r
+            )
+            self.range_types[(t, r)] = int(np.count_nonzero(in_range & counted))
+        self.ammo = int(np.count_nonzero(columns.compare("ammo", "!=", 0) & counted))
+        self.keywords = preset_counter(TEXT_KEYWORDS.values())
+        self.move = 0
+        for item, is_counted in zip(equipment, counted):
+            if not is_counted:
+                continue
+            markers = text_markers(item.text)
+            for marker, name in TEXT_KEYWORDS.items():
+                if marker in markers:
+                    self.keywords[name] += 1
+            if "remove" not in markers and any(w in markers for w in MOVE_WORDS):
+                self.move += 1
+        self.tags = Counter(columns.value_counts("tag", counted))
+        self.ratings = Counter(columns.value_counts("rating", counted, missing=True))
+
+
+class MechStats:
+    def __init__(self, mechs: list[Mech], columns: Optional[ColumnStore] = None):
+        columns = card_columns(mechs, columns)
+        self.total = columns.size
+        self.factions = Counter(columns.value_counts("faction", missing=True))
+        self.hp = Counter(columns.histogram("hp", missing=True))
+        self.armor = Counter(columns.histogram("armor", missing=True))
+        self.hc = Counter(columns.histogram("hc", missing=True))
+        self.hardpoint_counts = Counter(columns.histogram("hardpoints"))
+        self.hardpoints = preset_counter(SIZES)
+        self.hardpoint_layouts = Counter()
+        for mech in mechs:
+            self.hardpoints.update(mech.hardpoints)
+            self.hardpoint_layouts[mech.hardpoints_str] += 1
+        self.tags = Counter(columns.value_counts("tag"))
+
+
+class DroneStats:
+    def __init__(self, drones: list[Drone], columns: Optional[ColumnStore] = None):
+        columns = card_columns(drones, columns)
+        self.total = columns.size
+        self.copies = columns.total("copies")
+        self.ranges = Counter(columns.histogram("range", missing=True))
+        # Targets mix numbers with letters like P, which the numeric column drops
+        self.targets = Counter(drone.target for drone in drones)
+        self.kinds = Counter()
+        for drone in drones:
+            self.kinds.update(ability_kinds(drone))
+
+
+class ManeuverStats:
+    def __init__(
+        self, maneuvers: list[Maneuver], columns: Optional[ColumnStore] = None
+    ):
+        columns = card_columns(maneuvers, columns)
+        self.total = columns.size
+        self.copies = columns.total("copies")
+        self.ratings = Counter(columns.value_counts("rating", missing=True))
+        self.targets = Counter(maneuver.target for maneuver in maneuvers)
+        self.kinds = Counter()
+        for maneuver in maneuvers:
+            self.kinds.update(ability_kinds(maneuver))
+
+
+def ability_kinds(card) -> list[str]:
+    kinds = []
+    if len(getattr(card, "actions", [])) > 0:
+        kinds.append("Action")
+    if len(getattr(card, "triggers", [])) > 0:
+        kinds.append("Trigger")
+    if len(getattr(card, "passives", [])) > 0:
+        kinds.append("Passive")
+    return kinds
+
+
+def stat_order(key) -> tuple:
+    """
+    Sorts numbers numerically, then other values as text, then None
+    """
+    if key is None:
+        return (2, "")
+    if isinstance(key, int):
+        return (0, key)
+    return (1, str(key))
+
+
+def format_counts(
+    title: str, counts: Counter, label: Callable = str, sort: bool = False
+) -> str:
+    items = (
+        sorted(counts.items(), key=lambda x: stat_order(x[0]))
+        if sort
+        else counts.items()
+    )
+    text = f"{title}\n"
+    for k, v in items:
+        text += f"{label(k)}: {v}\n"
+    return text
+
+
+def format_equipment_stats(stats: EquipmentStats) -> str:
+    output = format_counts("Sizes", stats.sizes)
+    output += "\n" + format_counts("Types", stats.types)
+    output += "\n" + format_counts(
+        "Full Types", stats.full_types, lambda k: f"{k[0]} {k[1]}"
+    )
+    output += "\n" + format_counts("Ranges", stats.ranges, lambda k: f"Range {k}")
+    output += "\nRanges by Type\n"
+    for k, v in sorted(stats.range_types.items()):
+        output += f"{k[0]} {k[1]}: {v}\n"
+    output += f"\nAmmo Equipment: {stats.ammo}\n"
+    for k, v in stats.keywords.items():
+        output += f"{k} Equipment: {v}\n"
+    for k, v in stats.tags.items():
+        output += f"{k} Equipment: {v}\n"
+    output += f"Move Equipment: {stats.move}\n"
+    for k, v in stats.ratings.items():
+        output += f"{k} Equipment: {v}\n"
+    output += f"Spare Equipment (not counted in other stats): {stats.spare}\n"
+    output += f"Total Equipment: {stats.total}"
+    return output
+
+
+def format_mech_stats(stats: MechStats) -> str:
+    output = format_counts("Factions", stats.factions)
+    output += "\n" + format_counts("HP", stats.hp, sort=True)
+    output += "\n" + format_counts("Armor", stats.armor, sort=True)
+    output += "\n" + format_counts("Heat Capacity", stats.hc, sort=True)
+    output += "\n" + format_counts("Hardpoint Count", stats.hardpoint_counts, sort=True)
+    output += "\n" + format_counts("Hardpoints", stats.hardpoints)
+    output += "\n" + format_counts("Hardpoint Layouts", stats.hardpoint_layouts)
+    for k, v in stats.tags.items():
+        output += f"{k} Mechs: {v}\n"
+    output += f"Total Mechs: {stats.total}"
+    return output
+
+
+def format_drone_stats(stats: DroneStats) -> str:
+    output = format_counts("Ranges", stats.ranges, lambda k: f"Range {k}", True)
+    output += "\n" + format_counts("Targets", stats.targets, sort=True)
+    output += "\n" + format_counts("Abilities", stats.kinds)
+    output += f"\nTotal Copies: {stats.copies}\n"
+    output += f"Total Drones: {stats.total}"
+    return output
+
+
+def format_maneuver_stats(stats: ManeuverStats) -> str:
+    output = format_counts("Ratings", stats.ratings)
+    output += "\n" + format_counts("Targets", stats.targets, sort=True)
+    output += "\n" + format_counts("Abilities", stats.kinds)
+    output += f"\nTotal Copies: {stats.copies}\n"
+    output += f"Total Maneuvers: {stats.total}"
+    return output
+
+
+# kind -> (stats class, formatter), where kind matches the GameDatabase list name
+STATS_KINDS = {
+    "equipment": (EquipmentStats, format_equipment_stats),
+    "mechs": (MechStats, format_mech_stats),
+    "drones": (DroneStats, format_drone_stats),
+    "maneuvers": (ManeuverStats, format_maneuver_stats),
+}
@@ -0,0 +1,214 @@
+import hashlib
+import os
+import pickle
+from functools import cached_property
+from typing import Optional, TypeVar
+
+from data_cache import schema_hash
+from game_data import (
+    DATA_FILES,
+    PREVIOUS_DATA_FILES,
+    current_db,
+    data_files_hash,
+    previous_db,
+)
+from game_defs import *
+from rename_matching import match_renames
+
+# Bump when a change to the diff or rename matching changes what a changelog holds
+CHANGELOG_VERSION = 1
+CHANGELOG_CACHE_PATH = "./changelog/.cache/full_changelog.pickle"
+
+T = TypeVar("T", Mech, Drone, Equipment, Maneuver)
+
+
+class CardChange:
+    """
+    One entry in a changelog. Added and deleted cards are shown in full, renamed
+    and changed cards as the fields that differ.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        current: Optional[T],
+        previous: Optional[T],
+        fields: list[FieldChange],
+    ):
+        self.kind = kind
+        self.current = current
+        self.previous = previous
+        self.fields = fields
+
+    def __str__(self):
+        if self.kind == "added":
+            return f"{self.current.name} was added.\n{self.current}\n"
+        if self.kind == "deleted":
+            return f"{self.previous.name} was deleted.\n{self.previous}\n"
+        title = diff_title(self.current, self.previous)
+        return title + "\n" + "".join(str(field) for field in self.fields) + "\n"
+
+
+class Changelog:
+    def __init__(
+        self,
+        added: list[T],
+        deleted: list[T],
+        renamed: list[T],
+        changed: list[T],
+        records: list[CardChange],
+    ):
+        self.added = added
+        self.deleted = deleted
+        self.renamed = renamed
+        self.changed = changed
+        self.records = records
+
+    @cached_property
+    def text(self) -> str:
+        return "".join(str(record) for record in self.records)
+
+
+class FullChangelog:
+    def __init__(
+        self,
+        mechs: Changelog,
+        equipment: Changelog,
+        drones: Changelog,
+        maneuvers: Changelog,
+    ):
+        self.mechs = mechs
+        self.equipment = equipment
+        self.drones = drones
+        self.maneuvers = maneuvers
+
+    def reprinted_cards(self) -> list[T]:
+        """
+        The current version of every added, renamed and changed card, the cards a
+        print run for this changelog has to replace
+        """
+        return [
+            card
+            for changelog in [self.mechs, self.equipment, self.drones, self.maneuvers]
+            for card in changelog.added + changelog.renamed + changelog.changed
+        ]
+
+
+# The changelog last built or read in this process, by changelog_key()
+changelog_cache: dict[str, FullChangelog] = {}
+
+
+def generate_full_changelog() -> FullChangelog:
+    db = current_db.refresh()
+    prev_db = previous_db.refresh()
+    mech_changelog = generate_changelog_for(db.mechs, prev_db.mechs)
+    equipment_changelog = generate_changelog_for(db.equipment, prev_db.equipment)
+    drone_changelog = generate_changelog_for(db.drones, prev_db.drones)
+    maneuver_changelog = generate_changelog_for(db.maneuvers, prev_db.maneuvers)
+    return FullChangelog(
+        mech_changelog, equipment_changelog, drone_changelog, maneuver_changelog
+    )
+
+
+def changelog_key() -> str:
+    digest = hashlib.sha256(f"changelog {CHANGELOG_VERSION} {schema_hash()}".encode())
+    digest.update(data_files_hash(DATA_FILES).encode())
+    digest.update(data_files_hash(PREVIOUS_DATA_FILES).encode())
+    return digest.hexdigest()
+
+
+def cached_full_changelog() -> FullChangelog:
+    """
+    The changelog between the current and previous data files, kept in memory and
+    on disk until either set of files changes
+    """
+    key = changelog_key()
+    changelog = changelog_cache.get(key)
+    use_disk = current_db.use_cache and previous_db.use_cache
+    if changelog is None and use_disk:
+        try:
+            with open(CHANGELOG_CACHE_PATH, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("key") == key:
+                changelog = cached["changelog"]
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+    if changelog is None:
+        changelog = generate_full_changelog()
+        if use_disk:
+            try:
+                os.makedirs(os.path.dirname(CHANGELOG_CACHE_PATH), exist_ok=True)
+                tmp_path = f"{CHANGELOG_CACHE_PATH}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(
+                        {"key": key, "changelog": changelog},
+                        f,
+                        protocol=pickle.HIGHEST_PROTOCOL,
+                    )
+                os.replace(tmp_path, CHANGELOG_CACHE_PATH)
+            except OSError:
+                pass
+    changelog_cache.clear()
+    changelog_cache[key] = changelog
+    return changelog
+
+
+def invalidate_changelog():
+    changelog_cache.clear()
+    try:
+        os.remove(CHANGELOG_CACHE_PATH)
+    except FileNotFoundError:
+        pass
+
+
+def generate_changelog_text() -> str:
+    changelog = cached_full_changelog()
+    text_changelog = (
+        changelog.mechs.text
+        + changelog.equipment.text
+        + changelog.drones.text
+        + changelog.maneuvers.text
+    )
+
+    if len(text_changelog) == 0:
+        text_changelog = "No changes."
+
+    return text_changelog
+
+
+def generate_changelog_for(
+    current_list: list[T],
+    previous_list: list[T],
+) -> Changelog:
+    previous_by_name = {item.name: item for item in previous_list}
+    current_names = {item.name for item in current_list}
+    changes = []
+    changed = []
+    added_items = []
+    for item in current_list:
+        prev_item = previous_by_name.get(item.name)
+        if prev_item is None:
+            added_items.append(item)
+            continue
+        fields = item.changes(prev_item)
+        if len(fields) > 0:
+            changes.append(CardChange("changed", item, prev_item, fields))
+            changed.append(item)
+    deleted_items = [item for item in previous_list if item.name not in current_names]
+    renames = match_renames(added_items, deleted_items)
+    actually_added = []
+    renamed = []
+    for item in added_items:
+        similar_item = renames.get(item.name)
+        if similar_item is None:
+            changes.append(CardChange("added", item, None, []))
+            actually_added.append(item)
+        else:
+            fields = item.changes(similar_item)
+            changes.append(CardChange("renamed", item, similar_item, fields))
+            renamed.append(item)
+    renamed_from = {item.name for item in renames.values()}
+    actually_deleted = [item for item in deleted_items if item.name not in renamed_from]
+    for item in actually_deleted:
+        changes.append(CardChange("deleted", None, item, []))
+    return Changelog(actually_added, actually_deleted, renamed, changed, changes)
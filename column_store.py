@@ -0,0 +1,118 @@
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+import numpy as np
+
+COMPARISONS = {
+    "=": np.equal,
+    "!=": np.not_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+}
+
+
+class ColumnStore:
+    """
+    Card attributes laid out as parallel arrays, one slot per card in list order.
+
+    Numeric columns are an int64 array plus a mask of which cards have an integer
+    value at all. Categorical columns are one boolean bitmap per lowercased value,
+    and a card may set several bits in the same column, as it does for tags. The
+    first spelling seen of each value is kept as its label for counts.
+    """
+
+    def __init__(
+        self,
+        cards: list,
+        numeric: dict[str, Callable[[Any], Any]],
+        categorical: dict[str, Callable[[Any], Iterable[Any]]],
+    ):
+        self.size = len(cards)
+        self.values: dict[str, np.ndarray] = {}
+        self.present: dict[str, np.ndarray] = {}
+        for name, getter in numeric.items():
+            raw = [getter(card) for card in cards]
+            present = np.array([isinstance(x, int) for x in raw], dtype=bool)
+            self.present[name] = present
+            self.values[name] = np.array(
+                [x if isinstance(x, int) else 0 for x in raw], dtype=np.int64
+            )
+        self.bitmaps: dict[str, dict[str, np.ndarray]] = {}
+        self.labels: dict[str, dict[str, Any]] = {}
+        for name, getter in categorical.items():
+            bitmaps: dict[str, np.ndarray] = {}
+            labels: dict[str, Any] = {}
+            for card_id, card in enumerate(cards):
+                for value in getter(card):
+                    key = str(value).lower()
+                    if key not in bitmaps:
+                        bitmaps[key] = np.zeros(self.size, dtype=bool)
+                        labels[key] = value
+                    bitmaps[key][card_id] = True
+            self.bitmaps[name] = bitmaps
+            self.labels[name] = labels
+
+    def empty(self) -> np.ndarray:
+        return np.zeros(self.size, dtype=bool)
+
+    def compare(self, name: str, op: str, number: int) -> np.ndarray:
+        return self.present[name] & COMPARISONS[op](self.values[name], number)
+
+    def any_of(self, name: str, values: Iterable[str]) -> np.ndarray:
+        mask = self.empty()
+        for value in values:
+            if value in self.bitmaps[name]:
+                mask |= self.bitmaps[name][value]
+        return mask
+
+    def has_value(self, name: str) -> np.ndarray:
+        return self.any_of(name, self.bitmaps[name].keys())
+
+    @staticmethod
+    def counts(masks: dict[Hashable, np.ndarray]) -> dict[Hashable, int]:
+        """
+        The number of cards in each mask, for the masks that have any, in the order
+        of their first card, as a Counter fed the cards in list order would have them
+        """
+        found = [
+            (int(np.argmax(mask)), key, int(np.count_nonzero(mask)))
+            for key, mask in masks.items()
+            if mask.any()
+        ]
+        return {key: count for _, key, count in sorted(found, key=lambda x: x[0])}
+
+    def value_counts(
+        self, name: str, mask: Optional[np.ndarray] = None, missing: bool = False
+    ) -> dict[Any, int]:
+        """
+        Counts each value's cards, among those in mask if given. With missing, cards
+        without a value are counted under None.
+        """
+        if mask is None:
+            mask = ~self.empty()
+        masks = {
+            self.labels[name][value]: bitmap & mask
+            for value, bitmap in self.bitmaps[name].items()
+        }
+        if missing:
+            masks[None] = mask & ~self.has_value(name)
+        return self.counts(masks)
+
+    def histogram(
+        self, name: str, mask: Optional[np.ndarray] = None, missing: bool = False
+    ) -> dict[Optional[int], int]:
+        present = self.present[name] if mask is None else self.present[name] & mask
+        masks = {
+            int(value): present & (self.values[name] == value)
+            for value in np.unique(self.values[name][present])
+        }
+        if missing:
+            masks[None] = (
+                ~self.present[name] if mask is None else ~self.present[name] & mask
+            )
+        return self.counts(masks)
+
+    def total(self, name: str, mask: Optional[np.ndarray] = None) -> int:
+        present = self.present[name] if mask is None else self.present[name] & mask
+        return int(self.values[name][present].sum())
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import pickle
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+# Bump when the snapshot layout changes in a way the source hashes would not catch
+SNAPSHOT_VERSION = 1
+
+# Snapshots hold pickled game_defs objects, so edits to the code that builds them
+# must invalidate the snapshot just like edits to the data files.
+SCHEMA_SOURCES = ["game_defs.py", "game_data.py"]
+
+
+class FileFingerprint:
+    def __init__(self, filename: str):
+        stat = os.stat(filename)
+        self.filename = filename
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime_ns
+        self._sha256 = None
+
+    @property
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            with open(self.filename, "rb") as f:
+                self._sha256 = hashlib.sha256(f.read()).hexdigest()
+        return self._sha256
+
+    def matches(self, other) -> bool:
+        """
+        Size and mtime are trusted as-is; the content hash is only compared when the
+        file was touched, so a checkout that rewrites identical bytes stays cached
+        """
+        if not isinstance(other, FileFingerprint) or self.size != other.size:
+            return False
+        return self.mtime == other.mtime or self.sha256 == other.sha256
+
+    def __getstate__(self):
+        return {"size": self.size, "mtime": self.mtime, "sha256": self.sha256}
+
+    def __setstate__(self, state):
+        self.filename = None
+        self.size = state["size"]
+        self.mtime = state["mtime"]
+        self._sha256 = state["sha256"]
+
+
+def schema_hash() -> str:
+    digest = hashlib.sha256(str(SNAPSHOT_VERSION).encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for source in SCHEMA_SOURCES:
+        with open(os.path.join(directory, source), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def snapshot_path(filename: str) -> str:
+    directory, basename = os.path.split(filename)
+    return os.path.join(directory, ".cache", f"{basename}.pickle")
+
+
+def read_snapshot(filename: str, fingerprint: FileFingerprint):
+    path = snapshot_path(filename)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if snapshot.get("schema") != schema_hash():
+        return None
+    if not fingerprint.matches(snapshot.get("source")):
+        return None
+    return snapshot
+
+
+def write_snapshot(filename: str, fingerprint: FileFingerprint, data):
+    path = snapshot_path(filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    snapshot = {"schema": schema_hash(), "source": fingerprint, "data": data}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_cached(
+    filename: str, loader: Callable[[str], T], use_cache: bool = True
+) -> tuple[T, bool]:
+    """
+    Returns the parsed contents of filename and whether they came from the snapshot
+    """
+    if not use_cache:
+        return loader(filename), False
+    fingerprint = FileFingerprint(filename)
+    snapshot = read_snapshot(filename, fingerprint)
+    if snapshot is not None:
+        if snapshot["source"].mtime != fingerprint.mtime:
+            # Matched by content only. Record the new mtime, or every later start
+            # would hash the whole file again.
+            try:
+                write_snapshot(filename, fingerprint, snapshot["data"])
+            except OSError:
+                pass
+        return snapshot["data"], True
+    data = loader(filename)
+    try:
+        write_snapshot(filename, fingerprint, data)
+    except OSError:
+        pass
+    return data, False
@@ -0,0 +1,675 @@
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Optional
+
+import numpy as np
+
+from column_store import ColumnStore
+from game_defs import Drone, Equipment, Maneuver, Mech, tokenize_text
+
+# Filter strings are compiled once into a predicate tree and then evaluated per card.
+#
+#     filter     := or_expr
+#     or_expr    := and_expr ("OR" and_expr)*
+#     and_expr   := not_expr ("AND"? not_expr)*
+#     not_expr   := "NOT" not_expr | atom
+#     atom       := "(" or_expr ")" | comparison | qualified | keyword | "quoted text"
+#     keyword    := word+
+#     comparison := field ("=" | "!=" | "<" | "<=" | ">" | ">=") value
+#     qualified  := field ":" (word | "quoted text")
+#
+# Bare keywords keep the meaning the old scans gave them, e.g. "ammo", "short",
+# "move" or a tag name, and adjacent words form one keyword so "jolly roger" still
+# names a mech. Operators are case sensitive so card text like "or" can still be
+# searched for.
+
+TOKEN_REGEX = re.compile(
+    r"""\s*(?:
+    (?P<paren>[()])
+    |(?P<cmp_field>[A-Za-z_]+)\s*(?P<op><=|>=|!=|=|<|>)\s*(?P<cmp_value>[^\s()"]+)
+    |(?P<field>[A-Za-z_]+):(?:"(?P<field_quoted>[^"]*)"|(?P<field_word>[^\s()"]+))
+    |"(?P<quoted>[^"]*)"
+    |(?P<word>[^\s()"]+)
+    )""",
+    re.VERBOSE,
+)
+
+OPERATORS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+class FilterSyntaxError(ValueError):
+    pass
+
+
+class Predicate(ABC):
+    # Whether select() can answer from a TokenIndex without looking at every card.
+    # select() returns a boolean mask over the index's cards.
+    uses_index = False
+
+    @abstractmethod
+    def matches(self, card) -> bool:
+        pass
+
+    def select(self, index: "TokenIndex") -> np.ndarray:
+        return index.scan(self.matches)
+
+    def filter(self, cards: list) -> list:
+        return [card for card in cards if self.matches(card)]
+
+    def search(self, index: "TokenIndex") -> list:
+        return index.cards_for(self.select(index))
+
+
+class Always(Predicate):
+    uses_index = True
+
+    def matches(self, card) -> bool:
+        return True
+
+    def select(self, index: "TokenIndex") -> np.ndarray:
+        return np.ones(index.size, dtype=bool)
+
+    def __str__(self) -> str:
+        return "TRUE"
+
+
+class AllOf(Predicate):
+    def __init__(self, children: list[Predicate]):
+        self.children = children
+        self.uses_index = any(child.uses_index for child in children)
+
+    def matches(self, card) -> bool:
+        return all(child.matches(card) for child in self.children)
+
+    def select(self, index: "TokenIndex") -> np.ndarray:
+        """
+        Intersects the indexed children first, then only checks the rest against
+        the cards that are left
+        """
+        mask = np.ones(index.size, dtype=bool)
+        for child in self.children:
+            if child.uses_index:
+                mask &= child.select(index)
+                if not mask.any():
+                    return mask
+        for child in self.children:
+            if not child.uses_index:
+                for card_id in np.flatnonzero(mask):
+                    mask[card_id] = child.matches(index.cards[card_id])
+        return mask
+
+    def __str__(self) -> str:
+        return "(" + " AND ".join(str(x) for x in self.children) + ")"
+
+
+class AnyOf(Predicate):
+    def __init__(self, children: list[Predicate]):
+        self.children = children
+        self.uses_index = all(child.uses_index for child in children)
+
+    def matches(self, card) -> bool:
+        return any(child.matches(card) for child in self.children)
+
+    def select(self, index: "TokenIndex") -> np.ndarray:
+        mask = np.zeros(index.size, dtype=bool)
+        for child in self.children:
+            mask |= child.select(index)
+        return mask
+
+    def __str__(self) -> str:
+        return "(" + " OR ".join(str(x) for x in self.children) + ")"
+
+
+class Not(Predicate):
+    def __init__(self, child: Predicate):
+        self.child = child
+        self.uses_index = child.uses_index
+
+    def matches(self, card) -> bool:
+        return not self.child.matches(card)
+
+    def select(self, index: "TokenIndex") -> np.ndarray:
+        return ~self.child.select(index)
+
+    def __str__(self) -> str:
+        return f"NOT {self.child}"
+
+
+class Test(Predicate):
+    def __init__(self, description: str, test: Callable[[Any], bool]):
+        self.description = description
+        self.test = test
+
+    def matches(self, card) -> bool:
+        return self.test(card)
+
+    def __str__(self) -> str:
+        return self.description
+
+
+class ColumnTest(Test):
+    """
+    A comparison that can also be answered from the index's ColumnStore
+    """
+
+    uses_index = True
+
+    def __init__(
+        self,
+        description: str,
+        test: Callable[[Any], bool],
+        selector: Callable[[ColumnStore], np.ndarray],
+    ):
+        super().__init__(description, test)
+        self.selector = selector
+
+    def select(self, index: "TokenIndex") -> np.ndarray:
+        return self.selector(index.columns)
+
+
+class Field:
+    """
+    A card attribute that can be compared against. Ordered fields compare by the
+    position of the value in order, e.g. size>=medium.
+    """
+
+    def __init__(
+        self,
+        getter: Callable[[Any], Any],
+        numeric: bool = False,
+        order: Optional[list[str]] = None,
+        value_aliases: Optional[dict[str, str]] = None,
+    ):
+        self.getter = getter
+        self.numeric = numeric
+        self.order = order
+        self.value_aliases = value_aliases or {}
+
+    def comparison(self, name: str, op: str, raw_value: str) -> Predicate:
+        compare = OPERATORS[op]
+        value = self.value_aliases.get(raw_value.lower(), raw_value.lower())
+        description = f"{name}{op}{value}"
+        getter = self.getter
+        if self.numeric and value.isdigit():
+            number = int(value)
+            return ColumnTest(
+                description,
+                lambda card: isinstance(getter(card), int)
+                and compare(getter(card), number),
+                lambda columns: columns.compare(name, op, number),
+            )
+        if self.order is not None:
+            if value not in self.order:
+                raise FilterSyntaxError(
+                    f"{name} must be one of {', '.join(self.order)}, not {raw_value}"
+                )
+            position = self.order.index(value)
+            order = self.order
+            wanted = [x for i, x in enumerate(order) if compare(i, position)]
+            return ColumnTest(
+                description,
+                lambda card: str(getter(card)).lower() in wanted,
+                lambda columns: columns.any_of(name, wanted),
+            )
+        if op not in ["=", "!="]:
+            raise FilterSyntaxError(f"{name}{op}{raw_value} needs a number")
+        test = lambda card: getter(card) is not None and compare(
+            str(getter(card)).lower(), value
+        )
+        if self.numeric:
+            # Non-numeric values of numeric fields, like target=C, are not columns
+            return Test(description, test)
+        if op == "=":
+            return ColumnTest(
+                description, test, lambda columns: columns.any_of(name, [value])
+            )
+        return ColumnTest(
+            description,
+            test,
+            lambda columns: columns.has_value(name) & ~columns.any_of(name, [value]),
+        )
+
+    def column(self) -> Callable[[Any], list[Any]]:
+        getter = self.getter
+        return lambda card: [] if getter(card) is None else [getter(card)]
+
+
+class Keyword(Predicate):
+    """
+    A bare word that matches if any of the indexed lookups, a substring of the card
+    name, a phrase in the card text or one of the extra tests does
+    """
+
+    uses_index = True
+
+    def __init__(
+        self,
+        word: str,
+        schema: "FilterSchema",
+        lookups: list[tuple[str, str]],
+        name_contains: bool = True,
+        phrases: Optional[list[str]] = None,
+        tests: Optional[list[Callable[[Any], bool]]] = None,
+    ):
+        self.word = word
+        self.schema = schema
+        self.lookups = lookups
+        self.name_contains = name_contains
+        self.phrases = phrases or []
+        self.tests = tests or []
+
+    def matches(self, card) -> bool:
+        fields = self.schema.index_fields
+        return (
+            any(token in fields[field](card) for field, token in self.lookups)
+            or (self.name_contains and self.word in card.name.lower())
+            or any(p in self.schema.phrase_text(card) for p in self.phrases)
+            or any(test(card) for test in self.tests)
+        )
+
+    def select(self, index: "TokenIndex") -> np.ndarray:
+        mask = np.zeros(index.size, dtype=bool)
+        for field, token in self.lookups:
+            mask |= index.lookup(field, token)
+        if self.name_contains:
+            mask |= index.names_containing(self.word)
+        for phrase in self.phrases:
+            mask |= index.phrase(phrase)
+        if len(self.tests) > 0:
+            mask |= index.scan(lambda card: any(test(card) for test in self.tests))
+        return mask
+
+    def __str__(self) -> str:
+        return self.word
+
+
+class FilterSchema:
+    def __init__(
+        self,
+        fields: dict[str, Field],
+        text_fields: dict[str, Callable[[Any], list[str]]],
+        index_fields: dict[str, Callable[[Any], Iterable[str]]],
+        phrase_text: Callable[[Any], str],
+        keyword: Callable[["FilterSchema", str], Predicate],
+    ):
+        self.fields = fields
+        self.text_fields = text_fields
+        # Lowercased tokens per card, "text" holding the tokenized card text
+        self.index_fields = index_fields
+        self.phrase_text = phrase_text
+        self.keyword_factory = keyword
+
+    def keyword(self, word: str) -> Predicate:
+        return self.keyword_factory(self, word)
+
+    def numeric_columns(self) -> dict[str, Callable[[Any], Any]]:
+        return {name: f.getter for name, f in self.fields.items() if f.numeric}
+
+    def categorical_columns(self) -> dict[str, Callable[[Any], Iterable[Any]]]:
+        columns = {name: f.column() for name, f in self.fields.items() if not f.numeric}
+        if "tag" in self.text_fields:
+            columns["tag"] = self.text_fields["tag"]
+        return columns
+
+    def column_store(self, cards: list) -> ColumnStore:
+        return ColumnStore(cards, self.numeric_columns(), self.categorical_columns())
+
+    def qualified(self, name: str, raw_value: str) -> Predicate:
+        value = raw_value.lower()
+        if name not in self.text_fields:
+            return self.keyword(f"{name}:{value}")
+        getter = self.text_fields[name]
+        return Test(
+            f'{name}:"{value}"',
+            lambda card: any(value in text.lower() for text in getter(card)),
+        )
+
+    def phrase(self, raw_value: str) -> Predicate:
+        value = raw_value.lower()
+        return Test(
+            f'"{value}"',
+            lambda card: any(
+                value in text.lower()
+                for getter in self.text_fields.values()
+                for text in getter(card)
+            ),
+        )
+
+
+class TokenIndex:
+    """
+    Posting lists from each of a schema's index fields' tokens to the ids (list
+    positions) of the cards that have them, plus a ColumnStore of the schema's
+    fields. Lookups return boolean masks over the card list.
+    """
+
+    def __init__(self, cards: list, schema: FilterSchema):
+        self.cards = cards
+        self.schema = schema
+        self.size = len(cards)
+        self.names = [card.name.lower() for card in cards]
+        postings: dict[str, dict[str, list[int]]] = {
+            field: {} for field in schema.index_fields
+        }
+        for card_id, card in enumerate(cards):
+            for field, getter in schema.index_fields.items():
+                for token in set(getter(card)):
+                    postings[field].setdefault(token, []).append(card_id)
+        self.postings: dict[str, dict[str, np.ndarray]] = {
+            field: {
+                token: np.array(ids, dtype=np.int64) for token, ids in tokens.items()
+            }
+            for field, tokens in postings.items()
+        }
+        self.columns = schema.column_store(cards)
+
+    def lookup(self, field: str, token: str) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        ids = self.postings[field].get(token)
+        if ids is not None:
+            mask[ids] = True
+        return mask
+
+    def names_containing(self, word: str) -> np.ndarray:
+        return np.fromiter((word in name for name in self.names), bool, self.size)
+
+    def phrase(self, phrase: str) -> np.ndarray:
+        words = tokenize_text(phrase)
+        if len(words) == 0:
+            return self.scan(lambda card: phrase in self.schema.phrase_text(card))
+        mask = np.ones(self.size, dtype=bool)
+        for word in words:
+            mask &= self.lookup("text", word)
+        for card_id in np.flatnonzero(mask):
+            mask[card_id] = phrase in self.schema.phrase_text(self.cards[card_id])
+        return mask
+
+    def scan(self, test: Callable[[Any], bool]) -> np.ndarray:
+        return np.fromiter((test(card) for card in self.cards), bool, self.size)
+
+    def cards_for(self, mask: np.ndarray) -> list:
+        return [self.cards[i] for i in np.flatnonzero(mask)]
+
+
+def tokenize(text: str) -> list[tuple]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_REGEX.match(text, position)
+        if match is None or match.end() == position:
+            raise FilterSyntaxError(f"Could not parse {text[position:]!r}")
+        position = match.end()
+        if match.group("paren"):
+            tokens.append((match.group("paren"),))
+        elif match.group("op"):
+            tokens.append(
+                (
+                    "cmp",
+                    match.group("cmp_field").lower(),
+                    match.group("op"),
+                    match.group("cmp_value"),
+                )
+            )
+        elif match.group("field"):
+            value = match.group("field_quoted")
+            if value is None:
+                value = match.group("field_word")
+            tokens.append(("field", match.group("field").lower(), value))
+        elif match.group("quoted") is not None:
+            tokens.append(("phrase", match.group("quoted")))
+        elif match.group("word") in ["AND", "OR", "NOT"]:
+            tokens.append((match.group("word"),))
+        else:
+            tokens.append(("word", match.group("word")))
+    return tokens
+
+
+class Parser:
+    def __init__(self, tokens: list[tuple], schema: FilterSchema):
+        self.tokens = tokens
+        self.position = 0
+        self.schema = schema
+
+    def peek(self) -> Optional[tuple]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def next(self) -> tuple:
+        token = self.peek()
+        if token is None:
+            raise FilterSyntaxError("Unexpected end of filter")
+        self.position += 1
+        return token
+
+    def parse(self) -> Predicate:
+        if len(self.tokens) == 0:
+            return Always()
+        predicate = self.parse_or()
+        if self.peek() is not None:
+            raise FilterSyntaxError(f"Unexpected {self.peek()[0]!r}")
+        return predicate
+
+    def parse_or(self) -> Predicate:
+        children = [self.parse_and()]
+        while self.peek() == ("OR",):
+            self.next()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else AnyOf(children)
+
+    def parse_and(self) -> Predicate:
+        children = [self.parse_not()]
+        while self.peek() is not None and self.peek() not in [("OR",), (")",)]:
+            if self.peek() == ("AND",):
+                self.next()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else AllOf(children)
+
+    def parse_not(self) -> Predicate:
+        if self.peek() == ("NOT",):
+            self.next()
+            return Not(self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self) -> Predicate:
+        token = self.next()
+        kind = token[0]
+        if kind == "(":
+            predicate = self.parse_or()
+            if self.next() != (")",):
+                raise FilterSyntaxError("Missing )")
+            return predicate
+        if kind == "cmp":
+            _, name, op, value = token
+            if name not in self.schema.fields:
+                raise FilterSyntaxError(f"Unknown field {name}")
+            return self.schema.fields[name].comparison(name, op, value)
+        if kind == "field":
+            return self.schema.qualified(token[1], token[2])
+        if kind == "phrase":
+            return self.schema.phrase(token[1])
+        if kind == "word":
+            words = [token[1]]
+            while self.peek() is not None and self.peek()[0] == "word":
+                words.append(self.next()[1])
+            return self.schema.keyword(" ".join(words).lower())
+        raise FilterSyntaxError(f"Unexpected {kind!r}")
+
+
+def equipment_keyword(schema: FilterSchema, word: str) -> Predicate:
+    if word == "true":
+        return Always()
+    if word == "ap":
+        return Keyword(word, schema, [("text", word)], name_contains=False)
+    lookups = [(field, word) for field in ["alias", "type", "form", "size", "tag"]]
+    phrases = []
+    tests = []
+    if word == "move":
+        lookups += [("text", w) for w in ["advance", "move", "reposition"]]
+        phrases += ["fall back", "change position"]
+    else:
+        lookups.append(("text", word))
+    if word == "ammo":
+        tests.append(lambda e: bool(e.ammo))
+    ranges = {"short": 1, "mid": 2, "long": 3}
+    if word in ranges:
+        tests.append(lambda e: e.range == ranges[word])
+    return Keyword(word, schema, lookups, phrases=phrases, tests=tests)
+
+
+FACTION_ALIASES = {
+    "feds": "feds",
+    "terrans": "feds",
+    "ares": "martians",
+    "martians": "martians",
+    "jovians": "jovians",
+    "jovian": "jovians",
+    "pirates": "pirates",
+    "pirate": "pirates",
+    "belter": "pirates",
+    "belters": "pirates",
+}
+
+
+def mech_keyword(schema: FilterSchema, word: str) -> Predicate:
+    lookups = [(field, word) for field in ["name", "faction", "hardpoint", "text"]]
+    if word in FACTION_ALIASES:
+        lookups.append(("faction", FACTION_ALIASES[word]))
+    return Keyword(word, schema, lookups, name_contains=False)
+
+
+def text_keyword(schema: FilterSchema, word: str) -> Predicate:
+    if word == "true":
+        return Always()
+    return Keyword(word, schema, [("text", word)])
+
+
+SIZES = ["small", "medium", "large"]
+RATINGS = ["cadet", "veteran", "ace"]
+
+EQUIPMENT_SCHEMA = FilterSchema(
+    fields={
+        "heat": Field(lambda e: e.heat, numeric=True),
+        "range": Field(lambda e: e.range, numeric=True),
+        "target": Field(lambda e: e.target, numeric=True),
+        "ammo": Field(lambda e: e.ammo, numeric=True),
+        "maxcharge": Field(lambda e: e.maxcharge, numeric=True),
+        "copies": Field(lambda e: e.copies, numeric=True),
+        "size": Field(lambda e: e.size, order=SIZES),
+        "rating": Field(lambda e: e.rating, order=RATINGS),
+        "type": Field(lambda e: e.type),
+        "form": Field(lambda e: e.form),
+    },
+    text_fields={
+        "name": lambda e: [e.name] + e.alias,
+        "alias": lambda e: e.alias,
+        "text": lambda e: [e.text],
+        "flavor": lambda e: [e.flavor_text or ""],
+        "tag": lambda e: e.tags,
+        "type": lambda e: [e.type],
+        "form": lambda e: [e.form],
+        "size": lambda e: [e.size],
+    },
+    index_fields={
+        "text": lambda e: e.text_tokens,
+        "alias": lambda e: [alias.lower() for alias in e.alias],
+        "type": lambda e: [e.type.lower()],
+        "form": lambda e: [e.form.lower()],
+        "size": lambda e: [e.size.lower()],
+        "tag": lambda e: [tag.lower() for tag in e.tags],
+    },
+    phrase_text=lambda e: e.text.lower(),
+    keyword=equipment_keyword,
+)
+
+MECH_SCHEMA = FilterSchema(
+    fields={
+        "heat": Field(lambda m: m.hc, numeric=True),
+        "hc": Field(lambda m: m.hc, numeric=True),
+        "hp": Field(lambda m: m.hp, numeric=True),
+        "armor": Field(lambda m: m.armor, numeric=True),
+        "hardpoints": Field(lambda m: len(m.hardpoints), numeric=True),
+        "faction": Field(lambda m: m.faction, value_aliases=FACTION_ALIASES),
+    },
+    text_fields={
+        "name": lambda m: [m.name, m.designation_name],
+        "ability": lambda m: [m.ability],
+        "text": lambda m: [m.ability],
+        "hardpoint": lambda m: m.hardpoints,
+        "faction": lambda m: [m.faction, m.faction_full_name],
+        "tag": lambda m: m.tags,
+    },
+    index_fields={
+        "text": lambda m: m.ability_tokens,
+        "name": lambda m: [m.name.lower()],
+        "faction": lambda m: [m.faction.lower()],
+        "hardpoint": lambda m: [h.lower() for h in m.hardpoints],
+        "tag": lambda m: [tag.lower() for tag in m.tags],
+    },
+    phrase_text=lambda m: m.ability.lower(),
+    keyword=mech_keyword,
+)
+
+DRONE_SCHEMA = FilterSchema(
+    fields={
+        "range": Field(lambda d: d.range, numeric=True),
+        "target": Field(lambda d: d.target, numeric=True),
+        "copies": Field(lambda d: d.copies, numeric=True),
+    },
+    text_fields={
+        "name": lambda d: [d.name],
+        "ability": lambda d: [d.ability],
+        "text": lambda d: [d.ability],
+    },
+    index_fields={"text": lambda d: d.text_tokens},
+    phrase_text=lambda d: d.ability.lower(),
+    keyword=text_keyword,
+)
+
+MANEUVER_SCHEMA = FilterSchema(
+    fields={
+        "target": Field(lambda m: m.target, numeric=True),
+        "copies": Field(lambda m: m.copies, numeric=True),
+        "rating": Field(lambda m: m.rating, order=RATINGS),
+    },
+    text_fields={
+        "name": lambda m: [m.name],
+        "text": lambda m: [m.text],
+    },
+    index_fields={"text": lambda m: m.text_tokens},
+    phrase_text=lambda m: m.text.lower(),
+    keyword=text_keyword,
+)
+
+SCHEMAS = {
+    Equipment: EQUIPMENT_SCHEMA,
+    Mech: MECH_SCHEMA,
+    Drone: DRONE_SCHEMA,
+    Maneuver: MANEUVER_SCHEMA,
+}
+
+
+@lru_cache(maxsize=256)
+def compile_filter(text: str, card_type: type) -> Predicate:
+    return Parser(tokenize(text), SCHEMAS[card_type]).parse()
+
+
+def compile_filters(filters: list[str], card_type: type) -> Predicate:
+    """
+    Compiles a list of filter strings that must all match, as the comma separated
+    filters from the bot and -f arguments from the CLI are
+    """
+    predicates = [compile_filter(f.strip(), card_type) for f in filters]
+    predicates = [p for p in predicates if not isinstance(p, Always)]
+    if len(predicates) == 0:
+        return Always()
+    return predicates[0] if len(predicates) == 1 else AllOf(predicates)
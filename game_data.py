@@ -1,9 +1,16 @@
 from game_defs import *
 import yaml
+import heapq
 import itertools
+from collections import Counter, OrderedDict
 from thefuzz import fuzz
-from typing import Union
-import string
+from typing import Optional, Union
+import time
+import hashlib
+
+from card_stats import STATS_KINDS, EquipmentStats, format_equipment_stats
+from data_cache import load_cached
+from filter_query import SCHEMAS, TokenIndex, compile_filters
 
 
 def parse_equipment(equipment) -> Equipment:
@@ -116,321 +123,309 @@ def get_all_maneuvers(filename: str = "data/maneuvers.yml") -> list[Maneuver]:
     return all_maneuvers
 
 
-def equipment_stats():
-    output = ""
-    sizes = {
-        "Small": 0,
-        "Medium": 0,
-        "Large": 0,
-    }
-    types = {
-        "Ballistic": 0,
-        "Energy": 0,
-        "Melee": 0,
-        "Missile": 0,
-        "Nanite": 0,
-        "Electronics": 0,
-        "Drone": 0,
-        "Auxiliary": 0,
-    }
-    ranges = {
-        0: 0,
-        1: 0,
-        2: 0,
-        3: 0,
-    }
-    range_types = {}
-    for r in ranges.keys():
-        if r != "Melee":
-            range_types[("Ballistic", r)] = 0
-            range_types[("Energy", r)] = 0
-    full_types = {}
-    for size in sizes.keys():
-        for t in types.keys():
-            full_types[(size, t)] = 0
-    ammo_weapons = 0
-    keywords = {
-        "Charge": 0,
-        "Disable": 0,
-        "AP": 0,
-        "Shred": 0,
-    }
-    icon_keywords = {
-        "<:vulnerable:>": 0,
-        "<:overheat:>": 0,
-        "<:shield:>": 0,
-        "<:suppression:>": 0,
-    }
-    icon_keyword_map = {
-        "<:vulnerable:>": "Vulnerable",
-        "<:overheat:>": "Overheat",
-        "<:shield:>": "Shield",
-        "<:suppression:>": "Suppression",
-    }
-    tag_counts = {}
-    ratings = {}
-    spare_equipment = 0
-    move_equipment = 0
-    total = 0
-    all_equipment = get_all_equipment()
-    for equipment in all_equipment:
-        total += 1
-        if "Spare" in equipment.tags:
-            spare_equipment += 1
-            continue
-        sizes[equipment.size] += 1
-        types[equipment.type] += 1
-        full_types[(equipment.size, equipment.type)] += 1
-        if equipment.range is not None:
-            ranges[equipment.range] += 1
-            range_type_key = (equipment.type, equipment.range)
-            if range_type_key in range_types:
-                range_types[range_type_key] += 1
-        if equipment.ammo:
-            ammo_weapons += 1
-        for key in keywords.keys():
-            if key in equipment.text:
-                keywords[key] += 1
-        for key in icon_keywords.keys():
-            if key in equipment.text:
-                icon_keywords[key] += 1
-        text = equipment.text.lower()
-        if "remove" not in text and (
-            "move" in text
-            or "reposition" in text
-            or "fall back" in text
-            or "advance" in text
-        ):
-            move_equipment += 1
-        for tag in equipment.tags:
-            if tag in tag_counts:
-                tag_counts[tag] += 1
-            else:
-                tag_counts[tag] = 1
-        if equipment.rating in ratings:
-            ratings[equipment.rating] += 1
-        else:
-            ratings[equipment.rating] = 1
-    output += "Sizes\n"
-    for k, v in sizes.items():
-        output += f"{k}: {v}\n"
-    output += "\nTypes\n"
-    for k, v in types.items():
-        output += f"{k}: {v}\n"
-    output += "\nFull Types\n"
-    for k, v in full_types.items():
-        output += f"{k[0]} {k[1]}: {v}\n"
-    output += "\nRanges\n"
-    for k, v in ranges.items():
-        output += f"Range {k}: {v}\n"
-    output += "\nRanges by Type\n"
-    for k, v in sorted(range_types.items()):
-        output += f"{k[0]} {k[1]}: {v}\n"
-    output += f"\nAmmo Equipment: {ammo_weapons}\n"
-    for k, v in keywords.items():
-        output += f"{k} Equipment: {v}\n"
-    for k, v in icon_keywords.items():
-        output += f"{icon_keyword_map[k]} Equipment: {v}\n"
-    for k, v in tag_counts.items():
-        output += f"{k} Equipment: {v}\n"
-    output += f"Move Equipment: {move_equipment}\n"
-    for k, v in ratings.items():
-        output += f"{k} Equipment: {v}\n"
-    output += f"Spare Equipment (not counted in other stats): {spare_equipment}\n"
-    output += f"Total Equipment: {total}"
-    return output
-
-
-def get_filtered_equipment(filters: list[str]) -> list[Equipment]:
-    parsed_filters = [f.lower() for f in filters]
-    all_equipment = get_all_equipment()
-    matching_equipment = []
-    for equipment in all_equipment:
-        ok = 0
-        tokenized_text = re.sub(r"[^a-zA-Z0-9\s]+", " ", equipment.text.lower()).split()
-        for f in parsed_filters:
-            if f == "true":
-                ok += 1
-            elif f == "ap":
-                if f in tokenized_text:
-                    ok += 1
-                continue
-            elif (
-                f != "move"
-                and f in tokenized_text
-                or f in equipment.name.lower()
-                or f in map(lambda x: x.lower(), equipment.alias)
-                or f == equipment.type.lower()
-                or f == equipment.form.lower()
-                or f == equipment.size.lower()
-            ):
-                ok += 1
-            elif f == "ammo" and equipment.ammo:
-                ok += 1
-            elif f == "short" and equipment.range == 1:
-                ok += 1
-            elif f == "mid" and equipment.range == 2:
-                ok += 1
-            elif f == "long" and equipment.range == 3:
-                ok += 1
-            elif f.startswith("size"):
-                op = f[4]
-                size = f[5:]
-                if op == "=" and equipment.size.lower() == size:
-                    ok += 1
-            elif f.startswith("type"):
-                op = f[4]
-                the_type = f[5:]
-                if op == "=" and equipment.type.lower() == the_type:
-                    ok += 1
-            elif f.startswith("form"):
-                op = f[4]
-                form = f[5:]
-                if op == "=" and equipment.form.lower() == form:
-                    ok += 1
-            elif f.startswith("heat"):
-                op = f[4]
-                heat = int(f[5])
-                if op == "=" and equipment.heat == heat:
-                    ok += 1
-                elif op == ">" and equipment.heat and equipment.heat > heat:
-                    ok += 1
-                elif op == "<" and equipment.heat and equipment.heat < heat:
-                    ok += 1
-            elif f.startswith("range"):
-                op = f[5]
-                the_range = int(f[6])
-                if op == "=" and equipment.range == the_range:
-                    ok += 1
-                elif op == ">" and equipment.range and equipment.range > the_range:
-                    ok += 1
-                elif op == "<" and equipment.range and equipment.range < the_range:
-                    ok += 1
-            elif f.startswith("target"):
-                op = f[6]
-                the_target = int(f[7])
-                if op == "=" and equipment.target == the_target:
-                    ok += 1
-            elif f.startswith("rating"):
-                op = f[6]
-                the_rating = f[7:]
-                eq_rating = (
-                    "None" if equipment.rating is None else equipment.rating.lower()
-                )
-                if op == "=" and eq_rating == the_rating:
-                    ok += 1
-            elif f == "move" and (
-                "advance" in tokenized_text
-                or "fall back" in equipment.text.lower()
-                or "move" in tokenized_text
-                or "reposition" in tokenized_text
-                or "change position" in equipment.text.lower()
-            ):
-                ok += 1
-            elif f in [t.lower() for t in equipment.tags]:
-                ok += 1
-        if ok == len(filters):
-            matching_equipment.append(equipment)
-    return matching_equipment
-
-
-def get_filtered_mechs(filters: list[str]):
-    parsed_filters = [f.lower() for f in filters]
-    all_mechs = get_all_mechs()
-    matching_mechs = []
-    for mech in all_mechs:
-        ok = 0
-        for f in parsed_filters:
-            if (
-                f == mech.name.lower()
-                or f == mech.faction.lower()
-                or f in [h.lower() for h in mech.hardpoints]
-            ):
-                ok += 1
-            elif f in ["feds", "terrans"] and mech.faction == "Feds":
-                ok += 1
-            elif f in ["ares", "martians"] and mech.faction == "Martians":
-                ok += 1
-            elif f in ["jovians", "jovian"] and mech.faction == "Jovians":
-                ok += 1
-            elif (
-                f in ["pirates", "pirate", "belter", "belters"]
-                and mech.faction == "Pirates"
-            ):
-                ok += 1
-            elif f.startswith("heat") and len(f) > 4:
-                op = f[4]
-                heat = int(f[5:])
-                if op == "=" and mech.hc == heat:
-                    ok += 1
-                elif op == ">" and mech.hc and mech.hc > heat:
-                    ok += 1
-                elif op == "<" and mech.hc and mech.hc < heat:
-                    ok += 1
-            elif f.startswith("hp") and len(f) > 2:
-                op = f[2]
-                hp = int(f[3:])
-                if op == "=" and mech.hp == hp:
-                    ok += 1
-                elif op == ">" and mech.hp and mech.hp > hp:
-                    ok += 1
-                elif op == "<" and mech.hp and mech.hp < hp:
-                    ok += 1
-            elif f.startswith("armor") and len(f) > 5:
-                op = f[5]
-                armor = int(f[6:])
-                if op == "=" and mech.armor == armor:
-                    ok += 1
-                elif op == ">" and mech.armor and mech.armor > armor:
-                    ok += 1
-                elif op == "<" and mech.armor and mech.armor < armor:
-                    ok += 1
-            elif f in re.split(
-                " |\n",
-                mech.ability.lower().translate(
-                    str.maketrans("", "", string.punctuation)
-                ),
-            ):  # This removes punctuation from the string and splits it into tokens
-                ok += 1
-        if ok == len(filters):
-            matching_mechs.append(mech)
-    return matching_mechs
+def equipment_stats() -> str:
+    return format_equipment_stats(EquipmentStats(get_all_equipment()))
+
+
+def get_filtered_equipment(
+    filters: list[str], all_equipment: Optional[list[Equipment]] = None
+) -> list[Equipment]:
+    if all_equipment is None:
+        all_equipment = get_all_equipment()
+    return compile_filters(filters, Equipment).filter(all_equipment)
+
+
+def get_filtered_mechs(
+    filters: list[str], all_mechs: Optional[list[Mech]] = None
+) -> list[Mech]:
+    if all_mechs is None:
+        all_mechs = get_all_mechs()
+    return compile_filters(filters, Mech).filter(all_mechs)
+
+
+def build_name_index(
+    cards: list,
+) -> dict[str, Union[Equipment, Mech, Drone, Maneuver]]:
+    """
+    Maps normalized names, then normalized aliases, to cards. The first card to claim
+    a key keeps it, so a name always wins over another card's alias.
+    """
+    index = {}
+    for card in cards:
+        index.setdefault(card.normalized_name, card)
+    for card in cards:
+        for alias in getattr(card, "alias", []):
+            index.setdefault(normalize_name(alias), card)
+    return index
+
+
+def trigrams(text: str) -> Counter:
+    return Counter(text[i : i + 3] for i in range(len(text) - 2))
+
+
+class FuzzyNameIndex:
+    """
+    Trigram posting lists over lowercased names and aliases.
+
+    fuzz.ratio is 100 * (1 - D / (len(a) + len(b))) where D is the number of
+    insertions and deletions turning one string into the other. Each of those edits
+    breaks at most 3 trigrams, so the trigrams two strings share put a lower bound
+    on D and therefore an upper bound on the ratio. Names are scored best bound
+    first, and scoring stops once no unscored name can reach the top results.
+    """
+
+    MIN_SCORE = 50
+
+    def __init__(self, cards: list):
+        self.cards = cards
+        self.entries: list[tuple[int, str]] = []
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        self.by_length: dict[int, list[int]] = {}
+        for card_id, card in enumerate(cards):
+            for name in [card.name] + getattr(card, "alias", []):
+                entry_id = len(self.entries)
+                lname = name.lower()
+                self.entries.append((card_id, lname))
+                self.by_length.setdefault(len(lname), []).append(entry_id)
+                for gram, count in trigrams(lname).items():
+                    self.postings.setdefault(gram, []).append((entry_id, count))
+
+    @staticmethod
+    def bound(query_length: int, length: int, shared: int) -> int:
+        total = query_length + length
+        if total == 0:
+            return 100
+        edits = max(0, (max(query_length, length) - 2 - shared) / 3)
+        by_trigrams = 100 * (1 - edits / total)
+        by_length = 200 * min(query_length, length) / total
+        return int(round(min(by_trigrams, by_length)))
+
+    def candidates(self, lname: str) -> list[tuple[int, Union[int, list[int]]]]:
+        """
+        Returns (bound, entry_id) for names sharing a trigram with lname and
+        (bound, entry_ids) for each group of same-length names sharing none
+        """
+        shared: dict[int, int] = {}
+        for gram, query_count in trigrams(lname).items():
+            for entry_id, count in self.postings.get(gram, []):
+                shared[entry_id] = shared.get(entry_id, 0) + min(query_count, count)
+        candidates = []
+        for entry_id, count in shared.items():
+            length = len(self.entries[entry_id][1])
+            candidates.append((self.bound(len(lname), length, count), entry_id))
+        for length, entry_ids in self.by_length.items():
+            unshared = [x for x in entry_ids if x not in shared]
+            if len(unshared) > 0:
+                candidates.append((self.bound(len(lname), length, 0), unshared))
+        return candidates
+
+    def query(
+        self, lname: str, threshold: int, limit: int = 3
+    ) -> list[tuple[Union[Equipment, Mech, Drone, Maneuver], int]]:
+        """
+        Returns the best match alone once it reaches threshold, since QueryResults
+        only reads the options when nothing was accepted, otherwise the top limit
+        """
+        candidates = sorted(
+            (x for x in self.candidates(lname) if x[0] > FuzzyNameIndex.MIN_SCORE),
+            key=lambda x: x[0],
+            reverse=True,
+        )
+        scores: dict[int, int] = {}
+        floor = FuzzyNameIndex.MIN_SCORE + 1
+        for bound, entry_ids in candidates:
+            if bound < floor:
+                break
+            if isinstance(entry_ids, int):
+                entry_ids = [entry_ids]
+            for entry_id in entry_ids:
+                card_id, name = self.entries[entry_id]
+                score = fuzz.ratio(lname, name)
+                if score > scores.get(card_id, FuzzyNameIndex.MIN_SCORE):
+                    scores[card_id] = score
+                    best = heapq.nlargest(limit, scores.values())
+                    if best[0] >= threshold:
+                        floor = best[0]
+                    elif len(best) >= limit:
+                        floor = best[-1]
+        results = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+        if len(results) > 0 and results[0][1] >= threshold:
+            results = results[:1]
+        return [(self.cards[card_id], score) for card_id, score in results[:limit]]
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __str__(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = 0 if total == 0 else int(self.hits / total * 100)
+        text = f"Entries: {len(self.entries)}/{self.maxsize}\n"
+        text += f"Hits: {self.hits}\n"
+        text += f"Misses: {self.misses}\n"
+        text += f"Hit rate: {hit_rate}%"
+        return text
+
+
+DATA_FILES = {
+    "equipment": "data/equipment.yml",
+    "mechs": "data/mechs.yml",
+    "drones": "data/drones.yml",
+    "maneuvers": "data/maneuvers.yml",
+}
+
+PREVIOUS_DATA_FILES = {
+    "equipment": "./changelog/previous_equipment.yml",
+    "mechs": "./changelog/previous_mechs.yml",
+    "drones": "./changelog/previous_drones.yml",
+    "maneuvers": "./changelog/previous_maneuvers.yml",
+}
+
+DATA_LOADERS = {
+    "equipment": get_all_equipment,
+    "mechs": get_all_mechs,
+    "drones": get_all_drones,
+    "maneuvers": get_all_maneuvers,
+}
 
 
 class GameDatabase:
-    def __init__(self, changelog=False) -> None:
-        if changelog:
-            self.equipment = get_all_equipment("./changelog/previous_equipment.yml")
-            self.mechs = get_all_mechs("./changelog/previous_mechs.yml")
-            self.drones = get_all_drones("./changelog/previous_drones.yml")
-            self.maneuvers = get_all_maneuvers("./changelog/previous_maneuvers.yml")
-        else:
-            self.equipment = get_all_equipment()
-            self.mechs = get_all_mechs()
-            self.drones = get_all_drones()
-            self.maneuvers = get_all_maneuvers()
+    def __init__(self, changelog=False, use_cache=True) -> None:
+        self.version = 0
+        self.query_cache = LRUCache()
+        self.stats_cache: dict[tuple[int, str, bool], object] = {}
+        self.data_files = PREVIOUS_DATA_FILES if changelog else DATA_FILES
+        self.read_files(use_cache)
+
+    def read_files(self, use_cache: bool = True):
+        """
+        Loads the data files, replacing whatever was loaded before
+        """
+        self.load_times: dict[str, tuple[float, bool]] = {}
+        loaded = {}
+        for kind, filename in self.data_files.items():
+            start = time.perf_counter()
+            loaded[kind], from_snapshot = load_cached(
+                filename, DATA_LOADERS[kind], use_cache
+            )
+            self.load_times[filename] = (time.perf_counter() - start, from_snapshot)
+        self.load(
+            loaded["equipment"],
+            loaded["mechs"],
+            loaded["drones"],
+            loaded["maneuvers"],
+        )
+
+    def startup_report(self) -> str:
+        report = ""
+        for filename, (seconds, from_snapshot) in self.load_times.items():
+            source = "snapshot" if from_snapshot else "yaml"
+            report += f"{filename}: {seconds * 1000:.1f}ms ({source})\n"
+        total = sum(seconds for seconds, _ in self.load_times.values())
+        report += f"Total: {total * 1000:.1f}ms"
+        return report
+
+    def load(
+        self,
+        equipment: list[Equipment],
+        mechs: list[Mech],
+        drones: list[Drone],
+        maneuvers: list[Maneuver],
+    ):
+        self.equipment = equipment
+        self.mechs = mechs
+        self.drones = drones
+        self.maneuvers = maneuvers
         self.everything = list(
             itertools.chain.from_iterable(
                 [self.equipment, self.mechs, self.drones, self.maneuvers]
             )
         )
+        self.equipment_index = build_name_index(self.equipment)
+        self.mech_index = build_name_index(self.mechs)
+        self.drone_index = build_name_index(self.drones)
+        self.maneuver_index = build_name_index(self.maneuvers)
+        self.name_index = build_name_index(self.everything)
+        self.fuzzy_index = FuzzyNameIndex(self.everything)
+        self.equipment_tokens = TokenIndex(self.equipment, SCHEMAS[Equipment])
+        self.mech_tokens = TokenIndex(self.mechs, SCHEMAS[Mech])
+        self.drone_tokens = TokenIndex(self.drones, SCHEMAS[Drone])
+        self.maneuver_tokens = TokenIndex(self.maneuvers, SCHEMAS[Maneuver])
+        self.version += 1
+        self.query_cache.clear()
+        self.stats_cache.clear()
 
     def get_filtered_equipment(self, filters: list[str]) -> list[Equipment]:
-        return get_filtered_equipment(filters)
+        return compile_filters(filters, Equipment).search(self.equipment_tokens)
 
     def get_filtered_mechs(self, filters: list[str]) -> list[Mech]:
-        return get_filtered_mechs(filters)
+        return compile_filters(filters, Mech).search(self.mech_tokens)
+
+    def get_filtered_drones(self, filters: list[str]) -> list[Drone]:
+        return compile_filters(filters, Drone).search(self.drone_tokens)
+
+    def get_filtered_maneuvers(self, filters: list[str]) -> list[Maneuver]:
+        return compile_filters(filters, Maneuver).search(self.maneuver_tokens)
+
+    def stats(self, kind: str):
+        """
+        Returns the card_stats counts for one of equipment, mechs, drones or maneuvers,
+        computed once per data version
+        """
+        key = (self.version, kind, False)
+        if key not in self.stats_cache:
+            stats_class, _ = STATS_KINDS[kind]
+            tokens = {
+                "equipment": self.equipment_tokens,
+                "mechs": self.mech_tokens,
+                "drones": self.drone_tokens,
+                "maneuvers": self.maneuver_tokens,
+            }[kind]
+            self.stats_cache[key] = stats_class(getattr(self, kind), tokens.columns)
+        return self.stats_cache[key]
+
+    def stats_report(self, kind: str) -> str:
+        key = (self.version, kind, True)
+        if key not in self.stats_cache:
+            _, formatter = STATS_KINDS[kind]
+            self.stats_cache[key] = formatter(self.stats(kind))
+        return self.stats_cache[key]
 
     def get_equipment(self, name: str) -> Equipment | None:
-        return next(
-            (x for x in self.equipment if x.name == name or name in x.alias), None
-        )
+        return self.equipment_index.get(normalize_name(name))
 
     def get_mech(self, name: str) -> Mech | None:
-        return next((x for x in self.mechs if x.name == name), None)
+        return self.mech_index.get(normalize_name(name))
+
+    def get_drone(self, name: str) -> Drone | None:
+        return self.drone_index.get(normalize_name(name))
 
     def get_maneuver(self, name: str) -> Maneuver | None:
-        return next((x for x in self.maneuvers if x.name == name), None)
+        return self.maneuver_index.get(normalize_name(name))
+
+    def get_any(self, name: str) -> Union[Equipment, Mech, Drone, Maneuver, None]:
+        return self.name_index.get(normalize_name(name))
 
     class QueryResults:
         ok = False
@@ -452,23 +447,67 @@ class GameDatabase:
                     self.options = [option[0] for option in data[:3]]
 
     def fuzzy_query_name(self, name: str, threshold: int) -> QueryResults:
-
         lname = name.lower()
-        non_equipment = list(
-            itertools.chain.from_iterable([self.mechs, self.drones, self.maneuvers])
-        )
-        equipment_results = [
-            (x, max(map(lambda n: fuzz.ratio(lname, n.lower()), [x.name] + x.alias)))
-            for x in self.equipment
-        ]
-        non_equipment_results = [
-            (x, fuzz.ratio(lname, x.name.lower())) for x in non_equipment
-        ]
-        return GameDatabase.QueryResults(
-            sorted(
-                [x for x in equipment_results + non_equipment_results if x[1] > 50],
-                key=lambda x: x[1],
-                reverse=True,
-            ),
-            threshold,
-        )
+        key = (self.version, lname, threshold)
+        results = self.query_cache.get(key)
+        if results is None:
+            results = GameDatabase.QueryResults(
+                self.fuzzy_index.query(lname, threshold),
+                threshold,
+            )
+            self.query_cache.put(key, results)
+        return results
+
+
+def data_files_hash(files: dict[str, str]) -> str:
+    digest = hashlib.sha256()
+    for filename in files.values():
+        with open(filename, "rb") as f:
+            digest.update(
+                f"{filename} {hashlib.sha256(f.read()).hexdigest()}\n".encode()
+            )
+    return digest.hexdigest()
+
+
+class DatabaseProvider:
+    """
+    Builds one GameDatabase on first use and hands the same one to every caller,
+    so modules that need the data share a single copy and nothing is parsed until
+    something asks for it
+    """
+
+    def __init__(self, changelog: bool = False):
+        self.changelog = changelog
+        # Set before the first get() to skip the snapshot cache
+        self.use_cache = True
+        self.database: Optional[GameDatabase] = None
+        # data_files_hash() of the files the database was read from
+        self.loaded_hash: Optional[str] = None
+
+    @property
+    def data_files(self) -> dict[str, str]:
+        return PREVIOUS_DATA_FILES if self.changelog else DATA_FILES
+
+    def get(self) -> GameDatabase:
+        if self.database is None:
+            self.loaded_hash = data_files_hash(self.data_files)
+            self.database = GameDatabase(self.changelog, self.use_cache)
+        return self.database
+
+    def refresh(self) -> GameDatabase:
+        """
+        Like get(), but first reads the files again if they changed since the
+        database was loaded. The database is reloaded in place, so references to
+        it stay valid.
+        """
+        if self.database is None:
+            return self.get()
+        files_hash = data_files_hash(self.data_files)
+        if files_hash != self.loaded_hash:
+            self.database.read_files(self.use_cache)
+            self.loaded_hash = files_hash
+        return self.database
+
+
+current_db = DatabaseProvider()
+previous_db = DatabaseProvider(changelog=True)
@@ -1,9 +1,59 @@
 from functools import reduce
 from typing import Optional, Self
 import re
+import string
 from thefuzz import fuzz
 
 
+def normalize_name(name: str) -> str:
+    return re.sub(r"\W", "", name).lower()
+
+
+def tokenize_text(text: str) -> list[str]:
+    return re.sub(r"[^a-zA-Z0-9\s]+", " ", text.lower()).split()
+
+
+class FieldChange:
+    """
+    One field that differs between two versions of a card. Fields without a label
+    are shown as just the values, and multiline fields as the old text above the new.
+    """
+
+    def __init__(self, label: Optional[str], before, after, multiline: bool = False):
+        self.label = label
+        self.before = before
+        self.after = after
+        self.multiline = multiline
+
+    def __str__(self):
+        if self.multiline:
+            return f"{self.before}|->\n{self.after}"
+        if self.label is None:
+            return f"{self.before} -> {self.after}\n"
+        return f"{self.label}: {self.before} -> {self.after}\n"
+
+
+def field_changes(
+    current, previous, fields: list[tuple[str, Optional[str], bool]]
+) -> list[FieldChange]:
+    """
+    Compares the (attribute, label, multiline) fields of two versions of a card
+    """
+    changes = []
+    for attribute, label, multiline in fields:
+        before = getattr(previous, attribute)
+        after = getattr(current, attribute)
+        if before != after:
+            changes.append(FieldChange(label, before, after, multiline))
+    return changes
+
+
+def diff_title(current, previous) -> str:
+    if current.name == previous.name:
+        return current.name
+    return f"{previous.name} -> {current.name}"
+
+
 class Equipment:
     name: str
     size: str
@@ -26,6 +76,20 @@ class Equipment:
     legacy_text: bool
     rating: Optional[str]
 
+    # (attribute, label, multiline) compared by changes(), in changelog order
+    DIFF_FIELDS = [
+        ("size", "Size", False),
+        ("type", "Type", False),
+        ("form", None, False),
+        ("heat", "Heat", False),
+        ("range", "Range", False),
+        ("target", "Target", False),
+        ("ammo", "Ammo", False),
+        ("maxcharge", "Max Charge", False),
+        ("text", None, True),
+        ("flavor_text", None, True),
+    ]
+
     def __init__(self, **kwargs):
         self.name = str(kwargs.get("name"))
         self.size = str(kwargs.get("size"))
@@ -53,8 +117,7 @@ class Equipment:
         elif self.rating == "Ace":
             self.rating_int = 3
 
-        self.normalized_name = re.sub(r"\W", "", self.name)
-        self.normalized_name = self.normalized_name.lower()
+        self.normalized_name = normalize_name(self.name)
         self.filename = f"outputs/equipment/{self.normalized_name}.png"
         self.legacy_text = (
             self.info is None
@@ -66,6 +129,7 @@ class Equipment:
             self.text = kwargs.get("text", "")
         else:
             self.text = self.pretty_text()
+        self.text_tokens = set(tokenize_text(self.text))
 
     def pretty_text(self):
         if self.info is None:
@@ -133,43 +197,13 @@ class Equipment:
                 diffs += 2
         return diffs <= 2
 
+    def changes(self, other: Self) -> list[FieldChange]:
+        return field_changes(self, other, self.DIFF_FIELDS)
+
     def diff(self, other: Self) -> tuple[bool, str]:
-        is_diff = False
-        if self.name == other.name:
-            diffs = f"{self.name}\n"
-        else:
-            diffs = f"{other.name} -> {self.name}\n"
-        if self.size != other.size:
-            is_diff = True
-            diffs += f"Size: {other.size} -> {self.size}\n"
-        if self.type != other.type:
-            is_diff = True
-            diffs += f"Type: {other.type} -> {self.type}\n"
-        if self.form != other.form:
-            is_diff = True
-            diffs += f"{other.form} -> {self.form}\n"
-        if self.heat != other.heat:
-            is_diff = True
-            diffs += f"Heat: {other.heat} -> {self.heat}\n"
-        if self.range != other.range:
-            is_diff = True
-            diffs += f"Range: {other.range} -> {self.range}\n"
-        if self.target != other.target:
-            is_diff = True
-            diffs += f"Target: {other.target} -> {self.target}\n"
-        if self.ammo != other.ammo:
-            is_diff = True
-            diffs += f"Ammo: {other.ammo} -> {self.ammo}\n"
-        if self.maxcharge != other.maxcharge:
-            is_diff = True
-            diffs += f"Max Charge: {other.maxcharge} -> {self.maxcharge}\n"
-        if self.text != other.text:
-            is_diff = True
-            diffs += f"{other.text}|->\n{self.text}"
-        if self.flavor_text != other.flavor_text:
-            is_diff = True
-            diffs += f"{other.flavor_text}|->\n{self.flavor_text}"
-        return (is_diff, diffs)
+        changes = self.changes(other)
+        diffs = diff_title(self, other) + "\n" + "".join(str(c) for c in changes)
+        return (len(changes) > 0, diffs)
 
 
 class Mech:
@@ -191,6 +225,14 @@ class Mech:
     copies: int
     legacy_text: bool
 
+    DIFF_FIELDS = [
+        ("hp", "HP", False),
+        ("armor", "Armor", False),
+        ("hc", "Heat Capacity", False),
+        ("hardpoints_str", "Hardpoints", False),
+        ("ability", None, True),
+    ]
+
     def __init__(self, **kwargs):
         self.name = str(kwargs.get("name"))
         self.designation_name = str(kwargs.get("designation_name"))
@@ -218,8 +260,7 @@ class Mech:
         self.tags = kwargs.get("tags", [])
         self.copies = kwargs.get("copies", 1)
 
-        self.normalized_name = re.sub(r"\W", "", self.name)
-        self.normalized_name = self.normalized_name.lower()
+        self.normalized_name = normalize_name(self.name)
         self.filename = f"outputs/mechs/{self.normalized_name}.png"
         self.legacy_text = (
             self.info is None
@@ -231,6 +272,15 @@ class Mech:
             self.ability = kwargs.get("ability", "")
         else:
             self.ability = self.pretty_text()
+        # This removes punctuation from the ability and splits it into tokens
+        self.ability_tokens = set(
+            re.split(
+                " |\n",
+                self.ability.lower().translate(
+                    str.maketrans("", "", string.punctuation)
+                ),
+            )
+        )
 
     def __str__(self):
         text = self.name + "\n"
@@ -276,28 +326,13 @@ class Mech:
                 diffs += 2
         return diffs <= 2
 
+    def changes(self, other: Self) -> list[FieldChange]:
+        return field_changes(self, other, self.DIFF_FIELDS)
+
     def diff(self, other: Self) -> tuple[bool, str]:
-        is_diff = False
-        if self.name == other.name:
-            diffs = f"{self.name}\n"
-        else:
-            diffs = f"{other.name} -> {self.name}\n"
-        if self.hp != other.hp:
-            is_diff = True
-            diffs += f"HP: {other.hp} -> {self.hp}\n"
-        if self.armor != other.armor:
-            is_diff = True
-            diffs += f"Armor: {other.armor} -> {self.armor}\n"
-        if self.hc != other.hc:
-            is_diff = True
-            diffs += f"Heat Capacity: {other.hc} -> {self.hc}\n"
-        if self.hardpoints_str != other.hardpoints_str:
-            is_diff = True
-            diffs += f"Hardpoints: {other.hardpoints_str} -> {self.hardpoints_str}\n"
-        if self.ability != other.ability:
-            is_diff = True
-            diffs += f"{other.ability}|->\n{self.ability}"
-        return (is_diff, diffs)
+        changes = self.changes(other)
+        diffs = diff_title(self, other) + "\n" + "".join(str(c) for c in changes)
+        return (len(changes) > 0, diffs)
 
 
 class Drone:
@@ -312,6 +347,8 @@ class Drone:
     passives: list[str]
     legacy_text: bool
 
+    DIFF_FIELDS = [("ability", None, True)]
+
     def __init__(self, **kwargs):
         self.name = str(kwargs.get("name"))
         self.range = kwargs.get("range", None)
@@ -323,8 +360,7 @@ class Drone:
         self.passives = kwargs.get("passives", [])
         self.copies = kwargs.get("copies", 2)
 
-        self.normalized_name = re.sub(r"\W", "", self.name)
-        self.normalized_name = self.normalized_name.lower()
+        self.normalized_name = normalize_name(self.name)
         self.filename = f"outputs/drones/{self.normalized_name}.png"
 
         self.legacy_text = (
@@ -337,6 +373,7 @@ class Drone:
             self.ability = kwargs.get("ability", "")
         else:
             self.ability = self.pretty_text()
+        self.text_tokens = set(tokenize_text(self.ability))
 
     def pretty_text(self):
         text = ""
@@ -368,16 +405,13 @@ class Drone:
         text_ratio = fuzz.ratio(self.ability, other.ability)
         return text_ratio > 80
 
+    def changes(self, other: Self) -> list[FieldChange]:
+        return field_changes(self, other, self.DIFF_FIELDS)
+
     def diff(self, other: Self) -> tuple[bool, str]:
-        is_diff = False
-        if self.name == other.name:
-            diffs = f"{self.name}\n"
-        else:
-            diffs = f"{other.name} -> {self.name}\n"
-        if self.ability != other.ability:
-            is_diff = True
-            diffs += f"{other.ability}|->\n{self.ability}"
-        return (is_diff, diffs)
+        changes = self.changes(other)
+        diffs = diff_title(self, other) + "\n" + "".join(str(c) for c in changes)
+        return (len(changes) > 0, diffs)
 
 
 class Maneuver:
@@ -391,6 +425,8 @@ class Maneuver:
     legacy_text: bool
     rating: Optional[str]
 
+    DIFF_FIELDS = [("text", None, True)]
+
     def __init__(self, **kwargs):
         self.name = str(kwargs.get("name"))
         self.target = kwargs.get("target", None)
@@ -400,8 +436,7 @@ class Maneuver:
         self.copies = kwargs.get("copies", 2)
         self.rating = kwargs.get("rating", None)
 
-        self.normalized_name = re.sub(r"\W", "", self.name)
-        self.normalized_name = self.normalized_name.lower()
+        self.normalized_name = normalize_name(self.name)
         self.filename = f"outputs/maneuvers/{self.normalized_name}.png"
         self.legacy_text = (
             self.info is None and len(self.actions) == 0 and len(self.triggers) == 0
@@ -410,6 +445,7 @@ class Maneuver:
             self.text = kwargs.get("text", "")
         else:
             self.text = self.pretty_text()
+        self.text_tokens = set(tokenize_text(self.text))
 
     def __str__(self):
         text = f"{self.name}\n"
@@ -440,13 +476,10 @@ class Maneuver:
         text_ratio = fuzz.ratio(self.text, other.text)
         return text_ratio > 80
 
+    def changes(self, other: Self) -> list[FieldChange]:
+        return field_changes(self, other, self.DIFF_FIELDS)
+
     def diff(self, other: Self) -> tuple[bool, str]:
-        is_diff = False
-        if self.name == other.name:
-            diffs = f"{self.name}\n"
-        else:
-            diffs = f"{other.name} -> {self.name}\n"
-        if self.text != other.text:
-            is_diff = True
-            diffs += f"{other.text}|->\n{self.text}"
-        return (is_diff, diffs)
+        changes = self.changes(other)
+        diffs = diff_title(self, other) + "\n" + "".join(str(c) for c in changes)
+        return (len(changes) > 0, diffs)
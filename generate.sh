@@ -1,66 +1,54 @@
 #!/usr/bin/env bash
 
+# Render and page processes for card_rendering.py and print_sheets.py, 0 for one
+# per core
+JOBS="${JOBS:-1}"
+# PNG encoding profile for every render, for example ENCODING=archival for releases
+ENCODING_ARGS=${ENCODING:+--encoding "$ENCODING"}
+
 mkdir -p outputs/equipment
-mkdir -p outputs/equipment_montages
 mkdir -p outputs/mechs
-mkdir -p outputs/mechs_montages
 mkdir -p outputs/drones
-mkdir -p outputs/drones_montages
 mkdir -p outputs/maneuvers
-mkdir -p outputs/maneuvers_montages
-mkdir -p outputs/changed
-mkdir -p outputs/changed_montages
 
 for i in "$@"; do
   if [ "$i" == "all" ]; then
-    ./clear_outputs.sh mechs equipment drones maneuvers changed
-    ./card_rendering.py all
-    ./run_changelog.py montage
-    ./make_pdf.sh mechs equipment drones maneuvers changed
+    ./card_rendering.py all --jobs "$JOBS" $ENCODING_ARGS
+    ./print_sheets.py mechs equipment drones maneuvers changed --jobs "$JOBS"
   fi
   if [ "$i" == "mechs" ]; then
-    ./clear_outputs.sh mechs
-    ./card_rendering.py mechs
-    ./make_pdf.sh mechs
+    ./card_rendering.py mechs --jobs "$JOBS" $ENCODING_ARGS
+    ./print_sheets.py mechs --jobs "$JOBS"
   fi
   if [ "$i" == "equipment" ]; then
-    ./clear_outputs.sh equipment
-    ./card_rendering.py equipment
-    ./make_pdf.sh equipment
+    ./card_rendering.py equipment --jobs "$JOBS" $ENCODING_ARGS
+    ./print_sheets.py equipment --jobs "$JOBS"
   fi
   if [ "$i" == "drones" ]; then
-    ./clear_outputs.sh drones
-    ./card_rendering.py drones
-    ./make_pdf.sh drones
+    ./card_rendering.py drones --jobs "$JOBS" $ENCODING_ARGS
+    ./print_sheets.py drones --jobs "$JOBS"
   fi
   if [ "$i" == "maneuvers" ]; then
-    ./clear_outputs.sh maneuvers
-    ./card_rendering.py maneuvers
-    ./make_pdf.sh maneuvers
+    ./card_rendering.py maneuvers --jobs "$JOBS" $ENCODING_ARGS
+    ./print_sheets.py maneuvers --jobs "$JOBS"
   fi
   if [ "$i" == "changed" ]; then
-    ./clear_outputs.sh changed
-    ./run_changelog.py montage
-    ./make_pdf.sh changed
+    ./card_rendering.py changed --jobs "$JOBS" $ENCODING_ARGS
+    ./print_sheets.py changed --jobs "$JOBS"
   fi
   if [ "$i" == "pngs" ]; then
-    ./clear_outputs.sh mechs equipment drones maneuvers
-    ./card_rendering.py all
+    ./card_rendering.py all --jobs "$JOBS" $ENCODING_ARGS
   fi
   if [ "$i" == "mech-pngs" ]; then
-    ./clear_outputs.sh mechs
-    ./card_rendering.py mechs
+    ./card_rendering.py mechs --jobs "$JOBS" $ENCODING_ARGS
   fi
   if [ "$i" == "equipment-pngs" ]; then
-    ./clear_outputs.sh equipment
-    ./card_rendering.py equipment
+    ./card_rendering.py equipment --jobs "$JOBS" $ENCODING_ARGS
   fi
   if [ "$i" == "maneuver-pngs" ]; then
-    ./clear_outputs.sh maneuvers
-    ./card_rendering.py maneuvers
+    ./card_rendering.py maneuvers --jobs "$JOBS" $ENCODING_ARGS
   fi
   if [ "$i" == "drone-pngs" ]; then
-    ./clear_outputs.sh drones
-    ./card_rendering.py drones
+    ./card_rendering.py drones --jobs "$JOBS" $ENCODING_ARGS
   fi
 done
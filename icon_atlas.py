@@ -0,0 +1,58 @@
+import hashlib
+import os
+import pickle
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+ATLAS_DIRECTORY = "textures/.cache"
+
+
+def atlas_key(specs: dict[str, tuple]) -> str:
+    """
+    Hashes each icon's name, target size and source texture, so resizing a
+    constant or editing a texture rebuilds the atlas
+    """
+    digest = hashlib.sha256()
+    for name, (path, *size) in sorted(specs.items()):
+        stat = os.stat(path)
+        digest.update(
+            f"{name} {path} {size} {stat.st_size} {stat.st_mtime_ns}\n".encode()
+        )
+    return digest.hexdigest()
+
+
+def load_atlas(
+    name: str,
+    specs: dict[str, tuple],
+    build: Callable[[str, tuple], Any],
+    decode: Callable[[Any], T],
+) -> dict[str, T]:
+    """
+    Returns the decoded icons for specs, which maps icon name to (texture path,
+    *target size). The encoded icons are read from one cache file while its key
+    matches, otherwise build() encodes each icon again and the cache is rewritten.
+    """
+    path = os.path.join(ATLAS_DIRECTORY, f"{name}.pickle")
+    key = atlas_key(specs)
+    encoded = None
+    try:
+        with open(path, "rb") as f:
+            atlas = pickle.load(f)
+        if atlas.get("key") == key:
+            encoded = atlas["icons"]
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+    if encoded is None:
+        encoded = {icon: build(icon, spec) for icon, spec in specs.items()}
+        try:
+            os.makedirs(ATLAS_DIRECTORY, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(
+                    {"key": key, "icons": encoded}, f, protocol=pickle.HIGHEST_PROTOCOL
+                )
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+    return {icon: decode(data) for icon, data in encoded.items()}
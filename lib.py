@@ -1,4 +1,3 @@
-import re
 import textwrap
 from wand.drawing import Drawing
 
@@ -16,43 +15,3 @@ def wrap_text(ctx: Drawing, text: str, roi_width: int):
             wrapped_paras.append("\n")
 
     return "\n".join(wrapped_paras)
-
-
-EMOJI_REGEX = re.compile("<:[a-zA-Z0-9_-]{1,32}:>")
-NUMBER_TAG_REGEX = re.compile(r"(\d|AP|\]) <:")
-HEAT_COST_REGEX = re.compile(r"<:heat:> Cost")
-TAG_NUMBER_REGEX = re.compile(r":> (\d)")
-PUNCT_ENDS_REGEX = re.compile(r"!\)?[\.:]$")
-
-TAG_CHAR = "`"
-
-
-def wrap_text_tagged(text: str, width: int) -> str:
-    preprocessed_text = re.sub(NUMBER_TAG_REGEX, r"\1<:", text)
-    preprocessed_text = re.sub(TAG_NUMBER_REGEX, r":>\1", preprocessed_text)
-    preprocessed_text = re.sub(HEAT_COST_REGEX, "<:heat:>Cost", preprocessed_text)
-    untagged_text = re.sub(EMOJI_REGEX, TAG_CHAR, preprocessed_text)
-    tags = EMOJI_REGEX.findall(text)
-
-    paragraphs = untagged_text.splitlines()
-    wrapped_paras = []
-
-    wrapper = textwrap.TextWrapper(width=width)
-    for para in paragraphs:
-        if para.strip():
-            wrapped_paras.extend(wrapper.wrap(para))
-        else:
-            wrapped_paras.append("\n")
-
-    actual_paras = []
-    for para in wrapped_paras:
-        actual_para = para
-        merge_with_prev_para = PUNCT_ENDS_REGEX.match(actual_para)
-        while TAG_CHAR in actual_para:
-            actual_para = actual_para.replace(TAG_CHAR, tags.pop(0), 1)
-        if merge_with_prev_para is None:
-            actual_paras.append(actual_para)
-        else:
-            actual_paras[-1] += " " + actual_para
-
-    return "\n".join(actual_paras)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import multiprocessing
+import os
+import struct
+from functools import partial
+from io import BytesIO
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+
+from PIL import Image, ImageOps
+
+from card_rendering import CARD_HEIGHT, CARD_WIDTH, MECH_HEIGHT, MECH_WIDTH
+from changelog_diff import cached_full_changelog
+from game_data import current_db
+
+# Pixels per inch the sheets are printed at
+PDF_DENSITY = 600
+# Each reference card is printed twice
+REFERENCE_COPIES = 2
+
+# A tile is a rendered card, either its PNG path or the image itself
+Tile = Union[str, Image.Image]
+
+
+class SheetLayout:
+    def __init__(self, columns: int, rows: int, tile_width: int, tile_height: int):
+        self.columns = columns
+        self.rows = rows
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+
+    @property
+    def per_page(self) -> int:
+        return self.columns * self.rows
+
+    @property
+    def page_size(self) -> tuple[int, int]:
+        return (self.columns * self.tile_width, self.rows * self.tile_height)
+
+
+CARD_SHEET = SheetLayout(3, 3, CARD_WIDTH, CARD_HEIGHT)
+MECH_SHEET = SheetLayout(1, 2, MECH_WIDTH, MECH_HEIGHT)
+
+
+def card_tiles(cards: Iterable) -> list[str]:
+    """
+    Each card's PNG, repeated for every copy of the card, in filename order
+    """
+    return [
+        card.filename
+        for card in sorted(cards, key=lambda card: card.filename)
+        for _ in range(card.copies)
+    ]
+
+
+def directory_tiles(directory: str, copies: int = 1) -> list[str]:
+    return [
+        filename
+        for filename in sorted(glob.glob(os.path.join(directory, "*.png")))
+        for _ in range(copies)
+    ]
+
+
+def compose_page(layout: SheetLayout, tiles: list[Tile]) -> Image.Image:
+    """
+    Tiles row by row onto a white page. A tile of another size is scaled to fit its
+    cell and centered, so mechs can share a sheet with cards.
+    """
+    page = Image.new("RGB", layout.page_size, (255, 255, 255))
+    for i, tile in enumerate(tiles):
+        image = Image.open(tile) if isinstance(tile, str) else tile
+        if image.size != (layout.tile_width, layout.tile_height):
+            image = ImageOps.contain(image, (layout.tile_width, layout.tile_height))
+        x = (i % layout.columns) * layout.tile_width
+        y = (i // layout.columns) * layout.tile_height
+        x += (layout.tile_width - image.width) // 2
+        y += (layout.tile_height - image.height) // 2
+        if image.mode == "RGBA":
+            page.paste(image, (x, y), image)
+        else:
+            page.paste(image.convert("RGB"), (x, y))
+        if isinstance(tile, str):
+            image.close()
+    return page
+
+
+def encode_page(layout: SheetLayout, tiles: list[Tile]) -> tuple[int, int, bytes]:
+    """
+    Composes a page and deflates it with PNG row filters, which a PDF image can use
+    as is. Returns the page width, height and the compressed pixels.
+    """
+    page = compose_page(layout, tiles)
+    buffer = BytesIO()
+    page.save(buffer, format="PNG", compress_level=6)
+    page.close()
+    png = buffer.getvalue()
+    data = bytearray()
+    offset = 8
+    while offset < len(png):
+        length, kind = struct.unpack(">I4s", png[offset : offset + 8])
+        if kind == b"IDAT":
+            data += png[offset + 8 : offset + 8 + length]
+        offset += length + 12
+    return (layout.page_size[0], layout.page_size[1], bytes(data))
+
+
+def paginate(tiles: list[Tile], per_page: int) -> list[list[Tile]]:
+    return [tiles[i : i + per_page] for i in range(0, len(tiles), per_page)]
+
+
+class PdfWriter:
+    """
+    Writes a PDF with one image per page, each page written out as soon as it is
+    added, so only the page being written is held in memory
+    """
+
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self, f: BinaryIO, density: int = PDF_DENSITY):
+        self.f = f
+        self.density = density
+        self.offsets: dict[int, int] = {}
+        self.pages: list[int] = []
+        self.next_object = 3
+        self.f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def write_object(self, number: int, body: bytes, stream: Optional[bytes] = None):
+        self.offsets[number] = self.f.tell()
+        self.f.write(b"%d 0 obj\n" % number + body)
+        if stream is not None:
+            self.f.write(b"\nstream\n" + stream + b"\nendstream")
+        self.f.write(b"\nendobj\n")
+
+    def add_page(self, width: int, height: int, data: bytes):
+        """
+        Adds a page showing an RGB image of width x height, deflated with PNG row
+        filters
+        """
+        image, content, page = range(self.next_object, self.next_object + 3)
+        self.next_object += 3
+        self.write_object(
+            image,
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+            b"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode "
+            b"/DecodeParms << /Predictor 15 /Colors 3 /Columns %d >> /Length %d >>"
+            % (width, height, width, len(data)),
+            data,
+        )
+        points = (width * 72 / self.density, height * 72 / self.density)
+        drawing = b"q %.2f 0 0 %.2f 0 0 cm /Page Do Q" % points
+        self.write_object(content, b"<< /Length %d >>" % len(drawing), drawing)
+        self.write_object(
+            page,
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Resources << /XObject << /Page %d 0 R >> >> /Contents %d 0 R >>"
+            % ((self.PAGES,) + points + (image, content)),
+        )
+        self.pages.append(page)
+
+    def close(self):
+        kids = b" ".join(b"%d 0 R" % page for page in self.pages)
+        self.write_object(
+            self.PAGES,
+            b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.pages)),
+        )
+        self.write_object(
+            self.CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES
+        )
+        xref = self.f.tell()
+        self.f.write(b"xref\n0 %d\n0000000000 65535 f \n" % self.next_object)
+        for number in range(1, self.next_object):
+            self.f.write(b"%010d 00000 n \n" % self.offsets[number])
+        self.f.write(
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (self.next_object, self.CATALOG, xref)
+        )
+
+
+def encoded_pages(
+    layout: SheetLayout, tiles: list[Tile], jobs: int
+) -> Iterator[tuple[int, int, bytes]]:
+    """
+    Encodes the pages in order, across a pool of jobs processes if jobs > 1
+    """
+    pages = paginate(tiles, layout.per_page)
+    if jobs == 1 or len(pages) <= 1:
+        for page in pages:
+            yield encode_page(layout, page)
+        return
+    with multiprocessing.Pool(min(jobs, len(pages))) as pool:
+        # imap hands back pages in order while later ones are still being composed
+        yield from pool.imap(partial(encode_page, layout), pages)
+
+
+def write_pdf(path: str, layout: SheetLayout, tiles: list[Tile], jobs: int = 1) -> int:
+    """
+    Writes tiles as print sheets to a PDF, and returns the number of pages
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pdf = PdfWriter(f)
+        for done, page in enumerate(encoded_pages(layout, tiles, jobs), start=1):
+            pdf.add_page(*page)
+            print(f"{path}: page {done}")
+        pdf.close()
+    os.replace(tmp_path, path)
+    return len(pdf.pages)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "sheets",
+        nargs="+",
+        choices=["equipment", "mechs", "drones", "maneuvers", "changed", "references"],
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of page processes, 0 for one per core",
+    )
+    args = parser.parse_args()
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    game_db = current_db.get()
+    for sheet in args.sheets:
+        print(f"Generating {sheet} PDF")
+        layout = CARD_SHEET
+        if sheet == "equipment":
+            tiles = card_tiles(game_db.equipment)
+        elif sheet == "mechs":
+            layout = MECH_SHEET
+            tiles = card_tiles(game_db.mechs)
+        elif sheet == "drones":
+            tiles = card_tiles(game_db.drones)
+        elif sheet == "maneuvers":
+            tiles = card_tiles(game_db.maneuvers)
+        elif sheet == "changed":
+            # Each changed card's own PNG, repeated for its copies, with mechs
+            # scaled down to share the card sheet
+            tiles = card_tiles(cached_full_changelog().reprinted_cards())
+        else:
+            tiles = directory_tiles("outputs/references", REFERENCE_COPIES)
+        missing = {tile for tile in tiles if not os.path.exists(tile)}
+        if len(missing) > 0:
+            print(f"Skipping {len(missing)} cards that are not rendered:")
+            for filename in sorted(missing):
+                print(f"  {filename}")
+            tiles = [tile for tile in tiles if tile not in missing]
+        if len(tiles) == 0:
+            print(f"Nothing to print for {sheet}")
+            continue
+        write_pdf(f"{sheet}.pdf", layout, tiles, jobs)
+
+
+if __name__ == "__main__":
+    main()
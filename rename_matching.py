@@ -0,0 +1,236 @@
+import zlib
+from collections import defaultdict
+from itertools import combinations
+from typing import Optional, TypeVar
+
+import numpy as np
+from thefuzz import fuzz
+
+from game_defs import Drone, Equipment, Maneuver, Mech, tokenize_text
+
+T = TypeVar("T", Mech, Drone, Equipment, Maneuver)
+
+# Card kind -> the stats is_similar compares, and the rules text it compares.
+# Drones and maneuvers are only compared by text.
+SIGNATURE_FIELDS = {
+    Equipment: (
+        "size",
+        "type",
+        "form",
+        "heat",
+        "range",
+        "target",
+        "ammo",
+        "maxcharge",
+    ),
+    Mech: ("hp", "armor", "hc", "hardpoints_str"),
+    Drone: None,
+    Maneuver: None,
+}
+TEXT_FIELDS = {
+    Equipment: "text",
+    Mech: "ability",
+    Drone: "ability",
+    Maneuver: "text",
+}
+
+# is_similar accepts at most two differences among the stats, so a rename keeps
+# all but two of them. One key per such subset puts every pair it can accept in a
+# shared bucket.
+STATS_LEFT_OUT = 2
+# Cards matched by text alone compare every pair below this many added x deleted
+# pairs. Computing the MinHash bands costs about as much as 300 fuzz.ratio calls
+# per card, so comparing every pair stayed faster up to about 300 x 300 cards.
+TEXT_ALL_PAIRS_LIMIT = 100000
+
+SHINGLE_SIZE = 5
+# Drones and maneuvers are matched by text alone, and fuzz.ratio > 80 still allows
+# words swapped throughout, leaving about a quarter of the shingles shared. With
+# 64 bands of 2 hashes, texts sharing 25% of their shingles meet in some band 98%
+# of the time.
+MINHASH_BANDS = 64
+MINHASH_ROWS = 2
+MINHASH_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240601)
+MINHASH_A = _rng.integers(1, MINHASH_PRIME, MINHASH_BANDS * MINHASH_ROWS)
+MINHASH_B = _rng.integers(0, MINHASH_PRIME, MINHASH_BANDS * MINHASH_ROWS)
+
+
+def shingles(text: str) -> set[int]:
+    """
+    Hashes of the overlapping character runs of the text's normalized words
+    """
+    normalized = " ".join(tokenize_text(text))
+    if len(normalized) <= SHINGLE_SIZE:
+        runs = {normalized} if normalized else set()
+    else:
+        runs = {
+            normalized[i : i + SHINGLE_SIZE]
+            for i in range(len(normalized) - SHINGLE_SIZE + 1)
+        }
+    return {zlib.crc32(run.encode()) % MINHASH_PRIME for run in runs}
+
+
+def minhash_bands(text: str) -> list[tuple]:
+    ids = np.fromiter(shingles(text), dtype=np.int64)
+    if len(ids) == 0:
+        return []
+    hashes = (MINHASH_A[:, None] * ids[None, :] + MINHASH_B[:, None]) % MINHASH_PRIME
+    signature = hashes.min(axis=1).reshape(MINHASH_BANDS, MINHASH_ROWS)
+    return [(band,) + tuple(row) for band, row in enumerate(signature.tolist())]
+
+
+def blocking_keys(card: T) -> list[tuple]:
+    """
+    Keys a renamed card shares with its old version: its stats with any two left
+    out, or for cards matched by text alone, a band of the MinHash of its text
+    """
+    fields = SIGNATURE_FIELDS[type(card)]
+    if fields is None:
+        text = getattr(card, TEXT_FIELDS[type(card)])
+        return [("text",) + band for band in minhash_bands(text)]
+    values = tuple(getattr(card, field) for field in fields)
+    return [
+        ("stats", kept) + tuple(values[i] for i in kept)
+        for kept in combinations(range(len(fields)), len(fields) - STATS_LEFT_OUT)
+    ]
+
+
+def candidate_pairs(added: list[T], deleted: list[T]) -> set[tuple[int, int]]:
+    if len(added) == 0 or len(deleted) == 0:
+        return set()
+    text_only = SIGNATURE_FIELDS[type(added[0])] is None
+    if text_only and len(added) * len(deleted) <= TEXT_ALL_PAIRS_LIMIT:
+        return {(i, j) for i in range(len(added)) for j in range(len(deleted))}
+    buckets = defaultdict(list)
+    for j, item in enumerate(deleted):
+        for key in blocking_keys(item):
+            buckets[key].append(j)
+    pairs = set()
+    for i, item in enumerate(added):
+        for key in blocking_keys(item):
+            for j in buckets.get(key, []):
+                pairs.add((i, j))
+    return pairs
+
+
+def rename_score(current: T, previous: T) -> float:
+    """
+    How alike two versions are: the text's similarity out of 100, plus up to 100
+    for the share of the other fields that match
+    """
+    field = TEXT_FIELDS[type(current)]
+    score = fuzz.ratio(getattr(current, field), getattr(previous, field))
+    stats = [f for f, _, multiline in current.DIFF_FIELDS if not multiline]
+    if len(stats) > 0:
+        same = sum(getattr(current, f) == getattr(previous, f) for f in stats)
+        score += 100 * same / len(stats)
+    return score
+
+
+def assignment(scores: list[list[Optional[float]]]) -> list[tuple[int, int]]:
+    """
+    The (row, column) pairs that maximize the total score, each row and column used
+    at most once and never where the score is None. Hungarian method, O(n^3).
+    """
+    rows = len(scores)
+    columns = len(scores[0]) if rows > 0 else 0
+    n = max(rows, columns)
+    if n == 0:
+        return []
+    best = max((s for row in scores for s in row if s is not None), default=0)
+    forbidden = (best + 1) * n + 1
+    cost = [[forbidden] * n for _ in range(n)]
+    for i, row in enumerate(scores):
+        for j, score in enumerate(row):
+            if score is not None:
+                cost[i][j] = best - score
+    # Potentials and the matching of the classic shortest augmenting path version,
+    # 1-indexed with 0 as the virtual start column
+    u = [0.0] * (n + 1)
+    v = [0.0] * (n + 1)
+    match = [0] * (n + 1)
+    way = [0] * (n + 1)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        min_to = [float("inf")] * (n + 1)
+        used = [False] * (n + 1)
+        while match[j0] != 0:
+            used[j0] = True
+            i0 = match[j0]
+            delta = float("inf")
+            j1 = 0
+            for j in range(1, n + 1):
+                if not used[j]:
+                    reduced = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if reduced < min_to[j]:
+                        min_to[j] = reduced
+                        way[j] = j0
+                    if min_to[j] < delta:
+                        delta = min_to[j]
+                        j1 = j
+            for j in range(n + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_to[j] -= delta
+            j0 = j1
+        while j0 != 0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+    pairs = []
+    for j in range(1, n + 1):
+        i = match[j] - 1
+        if i < rows and j - 1 < columns and scores[i][j - 1] is not None:
+            pairs.append((i, j - 1))
+    return sorted(pairs)
+
+
+def match_renames(added: list[T], deleted: list[T]) -> dict[str, T]:
+    """
+    Pairs added cards with the deleted cards they were most likely renamed from,
+    keyed by the added card's name.
+
+    Only pairs that share a blocking key are compared, except among few enough
+    drones or maneuvers to compare every pair, and only those that is_similar
+    accepts can match. The pairs are then split into groups that share no card,
+    and each group is matched to pair as many cards as possible with the highest
+    total rename_score, rather than giving each added card the first deleted card
+    that fits.
+    """
+    edges = defaultdict(dict)
+    for i, j in candidate_pairs(added, deleted):
+        if added[i].is_similar(deleted[j]):
+            edges[i][j] = rename_score(added[i], deleted[j])
+    # Connected groups of added cards, found through the deleted cards they share
+    group_of = {}
+    groups = []
+    by_deleted = defaultdict(list)
+    for i, row in edges.items():
+        for j in row:
+            by_deleted[j].append(i)
+    for start in sorted(edges):
+        if start in group_of:
+            continue
+        group = []
+        stack = [start]
+        group_of[start] = len(groups)
+        while stack:
+            i = stack.pop()
+            group.append(i)
+            for j in edges[i]:
+                for other in by_deleted[j]:
+                    if other not in group_of:
+                        group_of[other] = len(groups)
+                        stack.append(other)
+        groups.append(sorted(group))
+    renames = {}
+    for group in groups:
+        columns = sorted({j for i in group for j in edges[i]})
+        scores = [[edges[i].get(j) for j in columns] for i in group]
+        for row, column in assignment(scores):
+            renames[added[group[row]].name] = deleted[columns[column]]
+    return renames
@@ -0,0 +1,103 @@
+import glob
+import hashlib
+import json
+import os
+from typing import Iterable, Optional
+
+MANIFEST_PATH = "outputs/render_manifest.json"
+
+
+class RenderManifest:
+    """
+    Remembers the fingerprint each output PNG was rendered from, so unchanged cards
+    can be skipped.
+
+    A fingerprint hashes the card's fields, the files only that card reads (its art)
+    and a shared hash of everything every card reads (icons, fonts and the renderer
+    version). Content hashes of input files are kept alongside and reused while a
+    file's size and mtime are unchanged.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.files: dict[str, dict] = {}
+        self.cards: dict[str, str] = {}
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.cards = data.get("cards", {})
+        except (OSError, ValueError):
+            pass
+
+    def file_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        cached = self.files.get(path)
+        if (
+            cached is not None
+            and cached["size"] == stat.st_size
+            and cached["mtime"] == stat.st_mtime_ns
+        ):
+            return cached["sha256"]
+        with open(path, "rb") as f:
+            sha256 = hashlib.sha256(f.read()).hexdigest()
+        self.files[path] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha256": sha256,
+        }
+        return sha256
+
+    def shared_hash(self, version: int, patterns: Iterable[str]) -> str:
+        digest = hashlib.sha256(f"renderer {version}".encode())
+        for path in sorted(p for pattern in patterns for p in glob.glob(pattern)):
+            digest.update(f"{path} {self.file_hash(path)}\n".encode())
+        return digest.hexdigest()
+
+    def fingerprint(
+        self,
+        card,
+        inputs: Iterable[str],
+        shared: str,
+        output: Optional[dict] = None,
+    ) -> str:
+        """
+        output holds how the PNG is written, such as the encoding profile's
+        settings, so changing them renders the card again
+        """
+        digest = hashlib.sha256(shared.encode())
+        # Sets, like the token sets, are written sorted so the hash is stable
+        digest.update(json.dumps(vars(card), sort_keys=True, default=sorted).encode())
+        if output is not None:
+            digest.update(json.dumps(output, sort_keys=True).encode())
+        for path in inputs:
+            digest.update(f"{path} {self.file_hash(path)}\n".encode())
+        return digest.hexdigest()
+
+    def is_current(self, filename: str, fingerprint: str) -> bool:
+        return self.cards.get(filename) == fingerprint and os.path.exists(filename)
+
+    def record(self, filename: str, fingerprint: str):
+        self.cards[filename] = fingerprint
+
+    def forget(self, filename: str):
+        self.cards.pop(filename, None)
+
+    def prune(self, directory: str, keep: set[str]) -> list[str]:
+        """
+        Deletes the PNGs in directory that no current card renders to
+        """
+        pruned = []
+        for filename in sorted(glob.glob(os.path.join(directory, "*.png"))):
+            if filename not in keep:
+                os.remove(filename)
+                self.forget(filename)
+                pruned.append(filename)
+        return pruned
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.files, "cards": self.cards}, f, indent=1)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,128 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from io import BytesIO
+from typing import IO, Optional, Union
+
+from PIL import Image
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """
+    How a rendered image is turned into a PNG. flatten drops the alpha channel of
+    images that are fully opaque, and palette stores images as at most 256
+    colours, exactly when they already have that few and quantized otherwise.
+    """
+
+    name: str
+    compress_level: int = 6
+    optimize: bool = False
+    flatten: bool = False
+    palette: bool = False
+
+    def prepare(self, image: Image.Image) -> Image.Image:
+        if (self.flatten or self.palette) and image.mode == "RGBA":
+            if image.getextrema()[3][0] == 255:
+                image = image.convert("RGB")
+        if self.palette and image.mode == "RGB":
+            colors = image.getcolors(256)
+            if colors is None:
+                image = image.quantize(256, dither=Image.Dither.NONE)
+            else:
+                palette = Image.new("P", (1, 1))
+                palette.putpalette([c for _, rgb in colors for c in rgb])
+                image = image.quantize(palette=palette, dither=Image.Dither.NONE)
+        return image
+
+    def save(self, image: Image.Image, fp: Union[str, IO[bytes]]):
+        self.prepare(image).save(
+            fp,
+            format="PNG",
+            compress_level=self.compress_level,
+            optimize=self.optimize,
+        )
+
+
+ENCODING_PROFILES = {
+    profile.name: profile
+    for profile in [
+        # Pillow's own defaults
+        EncodingProfile("default"),
+        # Intermediate files that are read back soon, such as print sheet inputs
+        EncodingProfile("fast", compress_level=1),
+        # Release files, smallest at any encode cost
+        EncodingProfile("archival", compress_level=9, optimize=True, flatten=True),
+        EncodingProfile("flat", flatten=True),
+        # Reference cards are black text on white with a few emoji
+        EncodingProfile("palette", compress_level=9, palette=True),
+    ]
+}
+
+
+class OutputSink(ABC):
+    """
+    Where a Renderer hands its finished image
+    """
+
+    # Whether the sink holds on to the image, so the renderer must not close it
+    keeps_image = False
+
+    @abstractmethod
+    def write(self, image: Image.Image):
+        pass
+
+
+class FileSink(OutputSink):
+    def __init__(
+        self,
+        path: str,
+        format: Optional[str] = None,
+        profile: Optional[EncodingProfile] = None,
+    ):
+        self.path = path
+        self.format = format
+        self.profile = profile
+
+    def write(self, image: Image.Image):
+        if self.profile is not None:
+            self.profile.save(image, self.path)
+        else:
+            image.save(self.path, format=self.format)
+
+
+class BytesSink(OutputSink):
+    """
+    Encodes the image into an in-memory buffer, rewound and ready to upload
+    """
+
+    def __init__(self, format: str = "PNG", profile: Optional[EncodingProfile] = None):
+        self.format = format
+        self.profile = profile
+        self.buffer = BytesIO()
+
+    def write(self, image: Image.Image):
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        if self.profile is not None:
+            self.profile.save(image, self.buffer)
+        else:
+            image.save(self.buffer, format=self.format)
+        self.buffer.seek(0)
+
+    def getvalue(self) -> bytes:
+        return self.buffer.getvalue()
+
+
+class ImageSink(OutputSink):
+    """
+    Keeps the rendered image itself, for stages that compose images without a disk
+    round trip
+    """
+
+    keeps_image = True
+
+    def __init__(self):
+        self.image: Optional[Image.Image] = None
+
+    def write(self, image: Image.Image):
+        self.image = image
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+
+import argparse
+import copy
+import os
+import random
+import re
+import string
+import tempfile
+import time
+import yaml
+from collections import Counter
+from io import BytesIO
+from thefuzz import fuzz
+
+from game_defs import *
+from game_data import *
+from render_output import ENCODING_PROFILES, ImageSink
+
+FILTER_QUERIES = [
+    ["Strong-Watchlist"],
+    ["Weak-Watchlist"],
+    ["Sus"],
+    ["ballistic", "heat>1"],
+    ["move"],
+    ["ap", "range=2"],
+]
+
+MECH_FILTER_QUERIES = [
+    ["feds"],
+    ["hp>5"],
+    ["large", "armor<2"],
+]
+
+
+def time_call(fn, repeat: int) -> float:
+    """
+    Returns the average milliseconds per call of fn
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def write_synthetic_data(source: str, count: int, directory: str) -> str:
+    """
+    Writes a copy of a data file with its entries cycled until there are count of them
+    """
+    with open(source, "r") as source_file:
+        data = yaml.safe_load(source_file)
+    items = list(data.items())
+    synthetic = {}
+    for i in range(count):
+        name, item = items[i % len(items)]
+        item = dict(item)
+        if i >= len(items):
+            name = f"{name} {i}"
+            item["alias"] = [f"{alias} {i}" for alias in item.get("alias", [])]
+        synthetic[name] = item
+    filename = os.path.join(directory, f"synthetic_{count}_{os.path.basename(source)}")
+    with open(filename, "w") as out_file:
+        yaml.safe_dump(synthetic, out_file, sort_keys=False)
+    return filename
+
+
+def synthetic_database(count: int, directory: str) -> tuple[GameDatabase, str, str]:
+    equipment_file = write_synthetic_data("data/equipment.yml", count, directory)
+    mechs_file = write_synthetic_data("data/mechs.yml", count, directory)
+    db = GameDatabase()
+    db.load(
+        get_all_equipment(equipment_file),
+        get_all_mechs(mechs_file),
+        db.drones,
+        db.maneuvers,
+    )
+    return db, equipment_file, mechs_file
+
+
+def baseline_filtered_equipment(filters: list[str], filename: str) -> list[Equipment]:
+    """
+    The filter get_filtered_equipment ran before the compiled predicates: it read
+    the YAML file and tested every filter string against every card on each call
+    """
+    parsed_filters = [f.lower() for f in filters]
+    all_equipment = get_all_equipment(filename)
+    matching_equipment = []
+    for equipment in all_equipment:
+        ok = 0
+        tokenized_text = re.sub(r"[^a-zA-Z0-9\s]+", " ", equipment.text.lower()).split()
+        for f in parsed_filters:
+            if f == "true":
+                ok += 1
+            elif f == "ap":
+                if f in tokenized_text:
+                    ok += 1
+                continue
+            elif (
+                f != "move"
+                and f in tokenized_text
+                or f in equipment.name.lower()
+                or f in map(lambda x: x.lower(), equipment.alias)
+                or f == equipment.type.lower()
+                or f == equipment.form.lower()
+                or f == equipment.size.lower()
+            ):
+                ok += 1
+            elif f == "ammo" and equipment.ammo:
+                ok += 1
+            elif f == "short" and equipment.range == 1:
+                ok += 1
+            elif f == "mid" and equipment.range == 2:
+                ok += 1
+            elif f == "long" and equipment.range == 3:
+                ok += 1
+            elif f.startswith("size"):
+                op = f[4]
+                size = f[5:]
+                if op == "=" and equipment.size.lower() == size:
+                    ok += 1
+            elif f.startswith("type"):
+                op = f[4]
+                the_type = f[5:]
+                if op == "=" and equipment.type.lower() == the_type:
+                    ok += 1
+            elif f.startswith("form"):
+                op = f[4]
+                form = f[5:]
+                if op == "=" and equipment.form.lower() == form:
+                    ok += 1
+            elif f.startswith("heat"):
+                op = f[4]
+                heat = int(f[5])
+                if op == "=" and equipment.heat == heat:
+                    ok += 1
+                elif op == ">" and equipment.heat and equipment.heat > heat:
+                    ok += 1
+                elif op == "<" and equipment.heat and equipment.heat < heat:
+                    ok += 1
+            elif f.startswith("range"):
+                op = f[5]
+                the_range = int(f[6])
+                if op == "=" and equipment.range == the_range:
+                    ok += 1
+                elif op == ">" and equipment.range and equipment.range > the_range:
+                    ok += 1
+                elif op == "<" and equipment.range and equipment.range < the_range:
+                    ok += 1
+            elif f.startswith("target"):
+                op = f[6]
+                the_target = int(f[7])
+                if op == "=" and equipment.target == the_target:
+                    ok += 1
+            elif f.startswith("rating"):
+                op = f[6]
+                the_rating = f[7:]
+                eq_rating = (
+                    "None" if equipment.rating is None else equipment.rating.lower()
+                )
+                if op == "=" and eq_rating == the_rating:
+                    ok += 1
+            elif f == "move" and (
+                "advance" in tokenized_text
+                or "fall back" in equipment.text.lower()
+                or "move" in tokenized_text
+                or "reposition" in tokenized_text
+                or "change position" in equipment.text.lower()
+            ):
+                ok += 1
+            elif f in [t.lower() for t in equipment.tags]:
+                ok += 1
+        if ok == len(filters):
+            matching_equipment.append(equipment)
+    return matching_equipment
+
+
+def baseline_filtered_mechs(filters: list[str], filename: str) -> list[Mech]:
+    """
+    The filter get_filtered_mechs ran before the compiled predicates
+    """
+    parsed_filters = [f.lower() for f in filters]
+    all_mechs = get_all_mechs(filename)
+    matching_mechs = []
+    for mech in all_mechs:
+        ok = 0
+        for f in parsed_filters:
+            if (
+                f == mech.name.lower()
+                or f == mech.faction.lower()
+                or f in [h.lower() for h in mech.hardpoints]
+            ):
+                ok += 1
+            elif f in ["feds", "terrans"] and mech.faction == "Feds":
+                ok += 1
+            elif f in ["ares", "martians"] and mech.faction == "Martians":
+                ok += 1
+            elif f in ["jovians", "jovian"] and mech.faction == "Jovians":
+                ok += 1
+            elif (
+                f in ["pirates", "pirate", "belter", "belters"]
+                and mech.faction == "Pirates"
+            ):
+                ok += 1
+            elif f.startswith("heat") and len(f) > 4:
+                op = f[4]
+                heat = int(f[5:])
+                if op == "=" and mech.hc == heat:
+                    ok += 1
+                elif op == ">" and mech.hc and mech.hc > heat:
+                    ok += 1
+                elif op == "<" and mech.hc and mech.hc < heat:
+                    ok += 1
+            elif f.startswith("hp") and len(f) > 2:
+                op = f[2]
+                hp = int(f[3:])
+                if op == "=" and mech.hp == hp:
+                    ok += 1
+                elif op == ">" and mech.hp and mech.hp > hp:
+                    ok += 1
+                elif op == "<" and mech.hp and mech.hp < hp:
+                    ok += 1
+            elif f.startswith("armor") and len(f) > 5:
+                op = f[5]
+                armor = int(f[6:])
+                if op == "=" and mech.armor == armor:
+                    ok += 1
+                elif op == ">" and mech.armor and mech.armor > armor:
+                    ok += 1
+                elif op == "<" and mech.armor and mech.armor < armor:
+                    ok += 1
+            elif f in re.split(
+                " |\n",
+                mech.ability.lower().translate(
+                    str.maketrans("", "", string.punctuation)
+                ),
+            ):  # This removes punctuation from the string and splits it into tokens
+                ok += 1
+        if ok == len(filters):
+            matching_mechs.append(mech)
+
+
+def benchmark_filters(
+    label: str, db: GameDatabase, equipment_file: str, mechs_file: str, repeat: int
+):
+    print(f"{label}: {len(db.equipment)} equipment, {len(db.mechs)} mechs")
+    print(f"{'query':<30}{'baseline ms':>12}{'in-memory ms':>14}{'speedup':>9}")
+    for filters in FILTER_QUERIES:
+        before = time_call(
+            lambda: baseline_filtered_equipment(filters, equipment_file),
+            repeat,
+        )
+        after = time_call(lambda: db.get_filtered_equipment(filters), repeat)
+        print(
+            f"{','.join(filters):<30}{before:>12.2f}{after:>14.2f}{before / after:>8.1f}x"
+        )
+    for filters in MECH_FILTER_QUERIES:
+        before = time_call(lambda: baseline_filtered_mechs(filters, mechs_file), repeat)
+        after = time_call(lambda: db.get_filtered_mechs(filters), repeat)
+        print(
+            f"{'mechs ' + ','.join(filters):<30}{before:>12.2f}{after:>14.2f}{before / after:>8.1f}x"
+        )
+    print()
+
+
+def full_fuzzy_scan(db: GameDatabase, name: str, threshold: int) -> list:
+    """
+    The scan fuzzy_query_name did before the trigram index, trimmed the same way
+    """
+    lname = name.lower()
+    results = sorted(
+        [
+            (x, max(fuzz.ratio(lname, n.lower()) for n in [x.name] + x.alias))
+            for x in db.equipment
+        ]
+        + [
+            (x, fuzz.ratio(lname, x.name.lower()))
+            for x in db.mechs + db.drones + db.maneuvers
+        ],
+        key=lambda x: x[1],
+        reverse=True,
+    )
+    results = [x for x in results if x[1] > 50]
+    if len(results) > 0 and results[0][1] >= threshold:
+        return results[:1]
+    return results[:3]
+
+
+def fuzzy_queries(db: GameDatabase, count: int, typos: int) -> list[str]:
+    rng = random.Random(typos)
+    names = [n for x in db.everything for n in [x.name] + getattr(x, "alias", [])]
+    queries = []
+    for _ in range(count):
+        query = list(rng.choice(names))
+        for _ in range(typos):
+            query[rng.randrange(len(query))] = rng.choice("aeiost")
+        queries.append("".join(query))
+    return queries
+
+
+def benchmark_fuzzy(label: str, db: GameDatabase, count: int):
+    """
+    Times the full scan against the trigram index alone, and separately the
+    cached fuzzy_query_name once every query is already in the query cache
+    """
+    print(f"{label}: {len(db.everything)} cards")
+    print(
+        f"{'typos':<8}{'full scan ms':>14}{'indexed ms':>12}{'speedup':>9}"
+        f"{'cached ms':>11}{'mismatches':>12}"
+    )
+    for typos in [0, 1, 3]:
+        queries = fuzzy_queries(db, count, typos)
+        mismatches = 0
+        for query in queries:
+            expected = full_fuzzy_scan(db, query, 90)
+            if db.fuzzy_index.query(query.lower(), 90) != expected:
+                mismatches += 1
+        before = time_call(
+            lambda: [full_fuzzy_scan(db, q, 90) for q in queries], 1
+        ) / len(queries)
+        after = time_call(
+            lambda: [db.fuzzy_index.query(q.lower(), 90) for q in queries], 1
+        ) / len(queries)
+        db.query_cache.clear()
+        for query in queries:
+            db.fuzzy_query_name(query, 90)
+        cached = time_call(
+            lambda: [db.fuzzy_query_name(q, 90) for q in queries], 1
+        ) / len(queries)
+        print(
+            f"{typos:<8}{before:>14.3f}{after:>12.3f}{before / after:>8.1f}x"
+            f"{cached:>11.4f}{mismatches:>12}"
+        )
+    print()
+
+
+COLUMN_QUERIES = [
+    "heat>=2",
+    "range<3",
+    "size>=medium AND heat>1",
+    "rating=ace AND range>=2",
+    "NOT (type=energy OR type=ballistic) AND maxcharge>0",
+]
+
+
+def synthetic_equipment(db: GameDatabase, count: int) -> list[Equipment]:
+    """
+    Copies of the current equipment renamed until there are count of them, built in
+    memory because parsing a YAML file this size takes minutes
+    """
+    equipment = []
+    for i in range(count):
+        item = copy.copy(db.equipment[i % len(db.equipment)])
+        item.name = f"{item.name} {i}"
+        equipment.append(item)
+    return equipment
+
+
+def benchmark_columns(count: int, repeat: int):
+    db = GameDatabase()
+    equipment = synthetic_equipment(db, count)
+    start = time.perf_counter()
+    db.load(equipment, db.mechs, db.drones, db.maneuvers)
+    print(f"Synthetic data: {count} equipment")
+    print(f"Index build: {(time.perf_counter() - start) * 1000:.0f}ms")
+    print(f"{'query':<55}{'scan ms':>9}{'column ms':>11}{'speedup':>9}")
+    for query in COLUMN_QUERIES:
+        predicate = compile_filters([query], Equipment)
+        before = time_call(lambda: predicate.filter(equipment), repeat)
+        after = time_call(lambda: db.get_filtered_equipment([query]), repeat)
+        print(f"{query:<55}{before:>9.2f}{after:>11.2f}{before / after:>8.1f}x")
+
+    def count_by_objects():
+        sizes = Counter(e.size for e in equipment)
+        types = Counter(e.type for e in equipment)
+        heat = Counter(e.heat for e in equipment if e.heat is not None)
+        tags = Counter(tag for e in equipment for tag in e.tags)
+        return sizes, types, heat, tags
+
+    def count_by_columns():
+        columns = db.equipment_tokens.columns
+        return (
+            columns.value_counts("size"),
+            columns.value_counts("type"),
+            columns.histogram("heat"),
+            columns.value_counts("tag"),
+        )
+
+    before = time_call(count_by_objects, repeat)
+    after = time_call(count_by_columns, repeat)
+    print(
+        f"{'counts (size, type, heat, tags)':<55}{before:>9.2f}{after:>11.2f}{before / after:>8.1f}x"
+    )
+    print()
+
+
+def benchmark_startup(repeat: int):
+    for changelog in [False, True]:
+        label = "Previous data" if changelog else "Current data"
+        GameDatabase(changelog=changelog)
+        cold = time_call(
+            lambda: GameDatabase(changelog=changelog, use_cache=False), repeat
+        )
+        warm = time_call(lambda: GameDatabase(changelog=changelog), repeat)
+        print(f"{label}: yaml {cold:.1f}ms, snapshot {warm:.1f}ms ({cold / warm:.1f}x)")
+        print(GameDatabase(changelog=changelog).startup_report())
+        print()
+
+
+def benchmark_encoding(count: int, repeat: int):
+    # Imported here so the other benchmarks do not need the rendering dependencies
+    from card_rendering import REFERENCE_RENDERERS, render_image, shared_icons
+
+    db = GameDatabase()
+    icons = shared_icons()
+    references = []
+    for renderer in REFERENCE_RENDERERS:
+        sink = ImageSink()
+        with renderer(icons, sink) as card:
+            card.render()
+        references.append(sink.image)
+    samples = {
+        "Equipment": [render_image(icons, card) for card in db.equipment[:count]],
+        "Mech": [render_image(icons, card) for card in db.mechs[:count]],
+        "Maneuver": [render_image(icons, card) for card in db.maneuvers[:count]],
+        "Drone": [render_image(icons, card) for card in db.drones[:count]],
+        "Reference": references,
+    }
+    print(
+        f"{'card type':<12}{'profile':<10}{'encode ms':>11}{'KiB':>9}{'vs default':>12}"
+    )
+    for kind, images in samples.items():
+        default_size = None
+        for name, profile in ENCODING_PROFILES.items():
+            size = 0
+
+            def encode():
+                nonlocal size
+                size = 0
+                for image in images:
+                    buffer = BytesIO()
+                    profile.save(image, buffer)
+                    size += buffer.tell()
+
+            ms = time_call(encode, repeat) / len(images)
+            size /= len(images)
+            default_size = default_size or size
+            print(
+                f"{kind:<12}{name:<10}{ms:>11.1f}{size / 1024:>9.0f}{size / default_size:>11.0%}"
+            )
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("action")
+    parser.add_argument("--repeat", "-r", type=int, default=5)
+    parser.add_argument("--size", "-n", type=int, default=10000)
+    args = parser.parse_args()
+    if args.action == "filters":
+        db = GameDatabase()
+        benchmark_filters(
+            "Current data", db, "data/equipment.yml", "data/mechs.yml", args.repeat
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            db, equipment_file, mechs_file = synthetic_database(args.size, directory)
+            benchmark_filters(
+                "Synthetic data", db, equipment_file, mechs_file, args.repeat
+            )
+    elif args.action == "startup":
+        benchmark_startup(args.repeat)
+    elif args.action == "columns":
+        benchmark_columns(args.size, args.repeat)
+    elif args.action == "fuzzy":
+        benchmark_fuzzy("Current data", GameDatabase(), 300)
+        with tempfile.TemporaryDirectory() as directory:
+            db, _, _ = synthetic_database(args.size, directory)
+        benchmark_fuzzy("Synthetic data", db, 30)
+    elif args.action == "encoding":
+        benchmark_encoding(min(args.size, 5), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
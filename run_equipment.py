@@ -11,10 +11,10 @@ from lib import *
 
 
 def generate_all():
-    with Icons() as icons:
-        all_equipment = get_all_equipment()
-        for equipment in all_equipment:
-            generate_card(icons, equipment)
+    icons = shared_icons()
+    all_equipment = get_all_equipment()
+    for equipment in all_equipment:
+        generate_card(icons, equipment)
 
 
 def generate_card(icons: Icons, equipment: Equipment):
@@ -152,10 +152,10 @@ def print_filtered(filters):
 
 def generate_filtered(filters):
     matching_equipment = get_filtered_equipment(filters)
-    with Icons() as icons:
-        for equipment in matching_equipment:
-            print(f"Generating card for {equipment.name}...")
-            generate_card(icons, equipment)
+    icons = shared_icons()
+    for equipment in matching_equipment:
+        print(f"Generating card for {equipment.name}...")
+        generate_card(icons, equipment)
     print(f"Found {len(matching_equipment)} matches.")
 
 
@@ -18,9 +18,10 @@ def generate_all():
 
 
 def generate_card(mech: Mech):
+    icons = shared_icons()
     with Image(
         width=CARD_WIDTH, height=CARD_HEIGHT, background=Color("white")
-    ) as img, Icons() as icons, Drawing() as draw_ctx:
+    ) as img, Drawing() as draw_ctx:
         draw_border(draw_ctx)
         draw_ctx.font = "fonts/HackNerdFont-Regular.ttf"
         draw_name(draw_ctx, mech)
@@ -0,0 +1,137 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from PIL import ImageFont
+
+EMOJI_REGEX = re.compile("<:[a-zA-Z0-9_-]{1,32}:>")
+# An emoji tag or a single character, the units a line is measured and broken in
+UNIT_REGEX = re.compile(r"<:[a-zA-Z0-9_-]{1,32}:>|.", re.DOTALL)
+CHUNK_REGEX = re.compile(r"\S+|\s+")
+
+# Glue that keeps a cost or a count on the same line as its emoji
+NUMBER_TAG_REGEX = re.compile(r"(\d|AP|\]) <:")
+TAG_NUMBER_REGEX = re.compile(r":> (\d)")
+HEAT_COST_REGEX = re.compile(r"<:heat:> Cost")
+# Closing punctuation that never starts a line of its own
+PUNCT_WORD_REGEX = re.compile(r"!\)?[\.:]$")
+
+# font -> character -> advance in pixels. Fonts come from load_font, so each one
+# lives for the whole process and the widths are measured once per glyph.
+glyph_widths: dict[ImageFont.FreeTypeFont, dict[str, float]] = {}
+
+
+@dataclass(frozen=True)
+class TextLine:
+    text: str
+    y: int
+    width: float
+
+
+@dataclass(frozen=True)
+class TextLayout:
+    lines: tuple[TextLine, ...]
+    line_height: int
+    height: int
+
+    @property
+    def text(self) -> str:
+        return "\n".join(line.text for line in self.lines)
+
+
+def emoji_width(font: ImageFont.FreeTypeFont) -> int:
+    """
+    Pilmoji draws each emoji as a square the size of the font
+    """
+    return round(font.size)
+
+
+def unit_width(font: ImageFont.FreeTypeFont, unit: str) -> float:
+    if len(unit) > 1:
+        return emoji_width(font)
+    widths = glyph_widths.setdefault(font, {})
+    width = widths.get(unit)
+    if width is None:
+        width = widths[unit] = font.getlength(unit)
+    return width
+
+
+def text_width(font: ImageFont.FreeTypeFont, text: str) -> float:
+    return sum(unit_width(font, unit) for unit in UNIT_REGEX.findall(text))
+
+
+def join_tags(text: str) -> str:
+    text = NUMBER_TAG_REGEX.sub(r"\1<:", text)
+    text = TAG_NUMBER_REGEX.sub(r":>\1", text)
+    return HEAT_COST_REGEX.sub("<:heat:>Cost", text)
+
+
+def break_word(
+    font: ImageFont.FreeTypeFont, word: str, max_width: float
+) -> list[tuple[str, float]]:
+    """
+    Splits a word wider than max_width between units, never inside an emoji tag
+    """
+    pieces = []
+    piece, width = "", 0.0
+    for unit in UNIT_REGEX.findall(word):
+        advance = unit_width(font, unit)
+        if piece and width + advance > max_width:
+            pieces.append((piece, width))
+            piece, width = "", 0.0
+        piece += unit
+        width += advance
+    pieces.append((piece, width))
+    return pieces
+
+
+def wrap_paragraph(
+    font: ImageFont.FreeTypeFont, paragraph: str, max_width: float
+) -> list[tuple[str, float]]:
+    """
+    Greedily fills lines up to max_width. Runs of spaces inside a line are kept, so
+    columns lined up with spaces stay lined up, and are dropped where a line breaks.
+    """
+    lines = []
+    line, width = "", 0.0
+    space, space_width = "", 0.0
+    for chunk in CHUNK_REGEX.findall(paragraph):
+        if chunk.isspace():
+            if line:
+                space, space_width = chunk, text_width(font, chunk)
+            continue
+        chunk_width = text_width(font, chunk)
+        if line and (
+            width + space_width + chunk_width <= max_width
+            or PUNCT_WORD_REGEX.match(chunk)
+        ):
+            line += space + chunk
+            width += space_width + chunk_width
+        else:
+            if line:
+                lines.append((line, width))
+            if chunk_width > max_width:
+                *pieces, (line, width) = break_word(font, chunk, max_width)
+                lines.extend(pieces)
+            else:
+                line, width = chunk, chunk_width
+        space, space_width = "", 0.0
+    lines.append((line, width))
+    return lines
+
+
+@lru_cache(maxsize=4096)
+def layout_text(
+    text: str, font: ImageFont.FreeTypeFont, max_width: float, spacing: int
+) -> TextLayout:
+    """
+    Wraps text, which may contain <:tag:> emoji, to lines no wider than max_width
+    pixels as measured with font, and places them the way multiline text is drawn
+    with the given spacing. A blank paragraph is kept as an empty line.
+    """
+    line_height = font.getbbox("A")[3] + spacing
+    lines = []
+    for paragraph in join_tags(text).splitlines() or [""]:
+        for line, width in wrap_paragraph(font, paragraph, max_width):
+            lines.append(TextLine(line, len(lines) * line_height, width))
+    return TextLayout(tuple(lines), line_height, len(lines) * line_height)